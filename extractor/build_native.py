@@ -0,0 +1,43 @@
+from os.path import dirname, join, basename, abspath
+from shutil import copyfile
+
+try:
+    from cffi import FFI
+except:
+    print("Building the native codec needs cffi and a C compiler. Please run")
+    print("\'python -m pip install cffi\'")
+    exit()
+
+HERE = dirname(abspath(__file__))
+NATIVE_FOLDER = join(HERE, "native")
+BUILD_FOLDER = join(NATIVE_FOLDER, "build")
+
+ffibuilder = FFI()
+
+ffibuilder.cdef("""
+int mssb_decompress(const uint8_t *src, size_t buffer_length, size_t max_byte_count,
+                    int lookback_bits, int repetition_bits, size_t original_size,
+                    uint8_t *dst, size_t dst_capacity,
+                    size_t *consumed, size_t *written);
+
+int mssb_is_valid(const uint8_t *src, size_t buffer_length, size_t max_byte_count,
+                  int lookback_bits, int repetition_bits,
+                  int has_original_size, size_t original_size,
+                  size_t *consumed, size_t *written);
+
+long long mssb_compress(const uint8_t *src, size_t length, int lookback_bits, int repetition_bits,
+                        uint8_t *dst, size_t dst_capacity);
+""")
+
+with open(join(NATIVE_FOLDER, "mssb_lz.c"), "r") as f:
+    ffibuilder.set_source("_mssb_lz", f.read())
+
+def main():
+    built_module = ffibuilder.compile(tmpdir=BUILD_FOLDER)
+
+    # put the module next to helper_mssb_data.py so it gets picked up
+    copyfile(built_module, join(HERE, basename(built_module)))
+    print(f"Built {basename(built_module)}")
+
+if __name__ == "__main__":
+    main()
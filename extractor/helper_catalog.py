@@ -0,0 +1,161 @@
+from os.path import splitext, exists, getmtime
+from os import replace
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+import json
+
+import numpy as np
+
+from helper_mssb_data import DataEntry
+from helper_checkpoint import write_json_atomic
+
+# the results.json keys, a record stores the index of its category
+CATEGORIES = [
+    'GameReferencedCompressedFiles',
+    'GameReferencedRawFiles',
+    'UnreferencedCompressedFiles',
+    'AdGCForms',
+]
+
+CATALOG_MAGIC = b'MSSBCAT1'
+# magic, record count, size of the string table
+CATALOG_HEADER = Struct('<8sII')
+
+# input and output index into the string table, order is the position in the category's json list
+CATALOG_DTYPE = np.dtype([
+    ('offset',           '<u4'),
+    ('compressed_size',  '<u4'),
+    ('original_size',    '<u4'),
+    ('input',            '<u4'),
+    ('output',           '<u4'),
+    ('order',            '<u4'),
+    ('lookback',         'u1'),
+    ('repetition',       'u1'),
+    ('compression_flag', 'u1'),
+    ('category',         'u1'),
+])
+
+def catalog_path(results_path:str) -> str:
+    """The catalog kept next to a results.json."""
+    return splitext(results_path)[0] + '.catalog'
+
+def catalog_is_current(results_path:str) -> bool:
+    """If the catalog of a results.json exists and was written after the json last changed."""
+    path = catalog_path(results_path)
+    # discovery writes the json first, an edited json is newer than its catalog
+    return exists(path) and exists(results_path) and getmtime(path) >= getmtime(results_path)
+
+def load_results(path:str) -> 'Catalog':
+    """A catalog from a catalog file or from a results.json."""
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            return Catalog.from_json(json.load(f))
+    return Catalog.load(path)
+
+class Catalog:
+    """The entries of results.json as fixed width records sorted by disk location, with the file names in a string table."""
+    def __init__(self, records:np.ndarray, strings:list[str]) -> None:
+        self.records = records
+        self.strings = strings
+        self.offsets = records['offset']
+
+    def from_json(results:dict) -> 'Catalog':
+        strings:list[str] = []
+        string_index:dict[str, int] = {}
+        def index(s:str) -> int:
+            if s not in string_index:
+                string_index[s] = len(strings)
+                strings.append(s)
+            return string_index[s]
+
+        records = []
+        for category, name in enumerate(CATEGORIES):
+            for order, d in enumerate(results.get(name, [])):
+                # an entry without an output name gets the default one
+                output = d["Output"] if "Output" in d else DataEntry.from_dict(d).output_name
+                records.append((d["offset"], d["compressedSize"], d["size"], index(d["Input"]), index(output), order,
+                                d["lookbackBitSize"], d["repetitionBitSize"], d["compressionFlag"], category))
+
+        records = np.array(records, dtype=CATALOG_DTYPE)
+        # stable, so entries at the same offset keep the json order
+        records = records[np.argsort(records['offset'], kind='stable')]
+        return Catalog(records, strings)
+
+    def load(path:str) -> 'Catalog':
+        with open(path, 'rb') as f:
+            data = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+        magic, count, strings_size = CATALOG_HEADER.unpack_from(data, 0)
+        if magic != CATALOG_MAGIC:
+            raise ValueError(f"{path} is not a catalog")
+
+        # the records stay in the memory map
+        records = np.frombuffer(data, dtype=CATALOG_DTYPE, count=count, offset=CATALOG_HEADER.size)
+        strings_start = CATALOG_HEADER.size + records.nbytes
+        strings = bytes(data[strings_start:strings_start + strings_size]).decode().split('\0')
+        return Catalog(records, strings)
+
+    def save(self, path:str):
+        strings = '\0'.join(self.strings).encode()
+        # written next to the target first so an interrupted write never leaves half a file
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(CATALOG_HEADER.pack(CATALOG_MAGIC, len(self.records), len(strings)))
+            f.write(self.records.tobytes())
+            f.write(strings)
+        replace(temp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def at_offset(self, offset:int) -> np.ndarray:
+        """The records that start at offset."""
+        return self.records[np.searchsorted(self.offsets, offset, 'left'):np.searchsorted(self.offsets, offset, 'right')]
+
+    def in_range(self, start:int, stop:int) -> np.ndarray:
+        """The records that start in [start, stop)."""
+        return self.records[np.searchsorted(self.offsets, start, 'left'):np.searchsorted(self.offsets, stop, 'left')]
+
+    def by_category(self, category:str, file:str=None) -> np.ndarray:
+        """The records of a category in their json order, only the ones in file if it is given."""
+        records = self.records[self.records['category'] == CATEGORIES.index(category)]
+        if file != None:
+            if file not in self.strings:
+                return records[:0]
+            records = records[records['input'] == self.strings.index(file)]
+        return records[np.argsort(records['order'], kind='stable')]
+
+    def stops(self, records:np.ndarray) -> np.ndarray:
+        """Where the records end, with the padding to the next 0x800."""
+        ends = records['offset'].astype(np.int64) + records['compressed_size']
+        return ends + (-ends % 0x800)
+
+    def to_entry(self, record) -> DataEntry:
+        return DataEntry.from_dict(self.to_dict(record))
+
+    def to_entries(self, records:np.ndarray) -> list[DataEntry]:
+        return [self.to_entry(x) for x in records]
+
+    def entries(self, category:str, file:str=None) -> list[DataEntry]:
+        return self.to_entries(self.by_category(category, file))
+
+    def to_dict(self, record) -> dict:
+        end = int(record['offset']) + int(record['compressed_size'])
+        return {
+            "Input": self.strings[record['input']],
+            "Output": self.strings[record['output']],
+            "lookbackBitSize": int(record['lookback']),
+            "repetitionBitSize": int(record['repetition']),
+            "size": int(record['original_size']),
+            "offset": int(record['offset']),
+            "compressedSize": int(record['compressed_size']),
+            "compressionFlag": int(record['compression_flag']),
+            "footerSize": -end % 0x800,
+        }
+
+    def to_json(self) -> dict:
+        """The same dictionary as results.json."""
+        return {name: [self.to_dict(x) for x in self.by_category(name)] for name in CATEGORIES}
+
+    def export_json(self, path:str):
+        write_json_atomic(self.to_json(), path)
@@ -0,0 +1,84 @@
+from os.path import exists, getsize, getmtime, dirname
+from os import replace
+from hashlib import sha1
+import json
+
+from helper_mssb_data import DataEntry, ensure_dir
+
+HASH_BLOCK_SIZE = 0x100000
+
+# hashing a multi gigabyte archive takes a while, only do it once per file per run
+_signature_cache:dict[tuple, list] = {}
+
+def file_signature(path:str) -> list:
+    """[size, sha1] of a file, None if it doesn't exist."""
+    if not exists(path):
+        return None
+
+    key = (path, getsize(path), getmtime(path))
+    if key not in _signature_cache:
+        h = sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                h.update(block)
+        _signature_cache[key] = [key[1], h.hexdigest()]
+    return _signature_cache[key]
+
+def write_json_atomic(obj, file_path:str):
+    # write next to the target first so an interrupted write never leaves half a file
+    ensure_dir(dirname(file_path))
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(obj, f, indent=2)
+    replace(temp_path, file_path)
+
+def entries_to_json(entries:list[DataEntry]) -> list[dict]:
+    return [x.to_dict() for x in entries]
+
+def entries_from_json(entries:list[dict]) -> list[DataEntry]:
+    return [DataEntry.from_dict(x) for x in entries]
+
+class Checkpoint:
+    """Results of named stages, kept on disk with the signatures of the files they were made from."""
+    def __init__(self, file_path:str) -> None:
+        self.file_path = file_path
+        self.stages:dict[str, dict] = {}
+
+        if exists(file_path):
+            try:
+                with open(file_path, 'r') as f:
+                    self.stages = json.load(f)
+            except ValueError:
+                print(f"Ignoring {file_path}, it isn't valid json")
+
+    def signature(self, input_files:list[str], params) -> dict:
+        # through json so tuples compare equal to the lists they are stored as
+        return json.loads(json.dumps({
+            'inputs': {x: file_signature(x) for x in input_files},
+            'params': params,
+        }))
+
+    def get(self, name:str, input_files:list[str], params=None):
+        """The stored result of a stage, None if there is none or its inputs changed."""
+        stage = self.stages.get(name)
+        if stage == None or stage['signature'] != self.signature(input_files, params):
+            return None
+        return stage['result']
+
+    def store(self, name:str, input_files:list[str], result, params=None):
+        self.stages[name] = {
+            'signature': self.signature(input_files, params),
+            'result': result,
+        }
+        write_json_atomic(self.stages, self.file_path)
+
+    def stage(self, name:str, input_files:list[str], compute, to_json=lambda x: x, from_json=lambda x: x, params=None):
+        """Runs compute() unless the stage was already done with the same inputs."""
+        result = self.get(name, input_files, params)
+        if result != None:
+            print(f"Skipping {name}, its inputs haven't changed")
+            return from_json(result)
+
+        result = compute()
+        self.store(name, input_files, to_json(result), params)
+        return result
@@ -0,0 +1,94 @@
+from os.path import join, getsize, getmtime, dirname
+from os import replace, remove, utime, walk, getpid
+from hashlib import sha1
+from typing import Union
+
+from helper_mssb_data import ArchiveDecompressor, ensure_dir
+
+class DecompressionCache:
+    """Decompressed data on disk, keyed by the compressed bytes and the compression settings.
+
+    The same compressed data decompresses to the same bytes in every region's archive, so one cache is shared by all of them.
+    The least recently used entries are removed once the cache grows past max_size bytes.
+    """
+    SUFFIX = '.bin'
+
+    def __init__(self, folder:str, max_size:int) -> None:
+        self.folder = folder
+        self.max_size = max_size
+        # only this process's view, other processes writing to the cache are caught up on when evicting.
+        # walking a full cache is slow, so it is only measured once something is written
+        self.size:Union[int, None] = None
+
+    def __entries(self) -> list[tuple[str, int, float]]:
+        # (path, size, last use)
+        entries = []
+        for folder, _, files in walk(self.folder):
+            for file in files:
+                if file.endswith(DecompressionCache.SUFFIX):
+                    path = join(folder, file)
+                    try:
+                        entries.append((path, getsize(path), getmtime(path)))
+                    except OSError:
+                        pass # removed by another process
+        return entries
+
+    def key(self, compressed:bytes, lookback_bit_count:int, repetition_bit_count:int, original_size:Union[int, None]) -> str:
+        h = sha1(f"{lookback_bit_count} {repetition_bit_count} {original_size} ".encode())
+        h.update(compressed)
+        return h.hexdigest()
+
+    def __path(self, key:str) -> str:
+        return join(self.folder, key[:2], key + DecompressionCache.SUFFIX)
+
+    def get(self, key:str) -> Union[bytes, None]:
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # the modification time is the last use
+            utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key:str, data:bytes):
+        if len(data) > self.max_size:
+            return
+
+        path = self.__path(key)
+        ensure_dir(dirname(path))
+        # workers can write the same entry at the same time, each writes its own file and the last one wins
+        temp_path = f"{path}.{getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        replace(temp_path, path)
+
+        if self.size == None:
+            self.size = sum(size for _, size, _ in self.__entries())
+        else:
+            self.size += len(data)
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is smaller than max_size."""
+        entries = sorted(self.__entries(), key=lambda x: x[2])
+        self.size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                remove(path)
+            except OSError:
+                pass # already removed by another process
+            self.size -= size
+
+    def decompress(self, compressed:bytes, lookback_bit_count:int, repetition_bit_count:int, original_size:int=None) -> Union[bytes, bytearray]:
+        """ArchiveDecompressor(...).decompress(), from the cache if this data was decompressed before."""
+        key = self.key(compressed, lookback_bit_count, repetition_bit_count, original_size)
+        data = self.get(key)
+        if data == None:
+            data = ArchiveDecompressor(compressed, lookback_bit_count, repetition_bit_count, original_size).decompress()
+            self.put(key, data)
+        return data
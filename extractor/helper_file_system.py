@@ -8,6 +8,11 @@ NAME_FILE_ZZZZ        = 'ZZZZ.dat'
 NAME_FILE_MAIN        = 'main.dol'
 NAME_FILE_RESULTS     = 'results.json'
 NAME_FILE_FILENAMES   = 'FileNames.json'
+NAME_FILE_CHECKPOINT  = 'discovery_checkpoint.json'
+
+# shared by every region, identical data is only decompressed once
+DECOMPRESSION_CACHE_FOLDER = join(OUTPUT_FOLDER, 'decompression cache')
+DECOMPRESSION_CACHE_SIZE   = 4 * 1024**3
 
 US_FOLDER             = 'US'
 US_DATA_FOLDER        = join(DATA_FOLDER,        US_FOLDER)
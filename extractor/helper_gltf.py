@@ -0,0 +1,132 @@
+from struct import Struct
+from os.path import dirname
+from io import BytesIO
+import typing
+import json
+
+import numpy as np
+
+from helper_mssb_data import ensure_dir
+
+GLB_MAGIC = b'glTF'
+GLB_VERSION = 2
+# magic, version, length of the file
+GLB_HEADER = Struct('<4sII')
+# length of the chunk, chunk type
+GLB_CHUNK_HEADER = Struct('<I4s')
+GLB_JSON_CHUNK = b'JSON'
+GLB_BIN_CHUNK = b'BIN\0'
+
+# buffer view targets
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+COMPONENT_TYPES = {
+    np.dtype(np.uint8):   5121,
+    np.dtype(np.uint16):  5123,
+    np.dtype(np.uint32):  5125,
+    np.dtype(np.float32): 5126,
+}
+ACCESSOR_TYPES = {
+    1: "SCALAR",
+    2: "VEC2",
+    3: "VEC3",
+    4: "VEC4",
+}
+
+# sampler wrap modes
+REPEAT = 10497
+
+def padded(b:bytes, fill:bytes) -> bytes:
+    # chunks and buffer views start on 4 bytes
+    return b + fill * (-len(b) % 4)
+
+class GLBFile:
+    """A binary glTF 2.0 file with everything in a single buffer, built up a mesh at a time."""
+    def __init__(self) -> None:
+        self.gltf = {
+            "asset": {"version": "2.0", "generator": "MSSB extractor"},
+            "scene": 0,
+            "scenes": [{"nodes": []}],
+            "nodes": [],
+            "meshes": [],
+            "materials": [],
+            "textures": [],
+            "samplers": [],
+            "images": [],
+            "accessors": [],
+            "bufferViews": [],
+        }
+        self.buffer = BytesIO()
+
+    def __add(self, key:str, item:dict) -> int:
+        self.gltf[key].append(item)
+        return len(self.gltf[key]) - 1
+
+    def add_buffer_view(self, data:bytes, target:int=None) -> int:
+        offset = self.buffer.tell()
+        self.buffer.write(padded(data, b'\0'))
+
+        view = {"buffer": 0, "byteOffset": offset, "byteLength": len(data)}
+        if target != None:
+            view["target"] = target
+        return self.__add("bufferViews", view)
+
+    def add_accessor(self, values:np.ndarray, target:int=None) -> int:
+        """values is (count,) or (count, components), the data is stored as it is typed."""
+        values = np.ascontiguousarray(values)
+        accessor = {
+            "bufferView": self.add_buffer_view(values.astype(values.dtype.newbyteorder('<')).tobytes(), target),
+            "componentType": COMPONENT_TYPES[values.dtype],
+            "count": len(values),
+            "type": ACCESSOR_TYPES[1 if values.ndim == 1 else values.shape[1]],
+        }
+        if len(values) > 0:
+            accessor["min"] = values.min(axis=0).reshape(-1).tolist()
+            accessor["max"] = values.max(axis=0).reshape(-1).tolist()
+        return self.__add("accessors", accessor)
+
+    def add_image(self, png:bytes, name:str=None) -> int:
+        """A texture of png data, returns the index of the texture."""
+        if len(self.gltf["samplers"]) == 0:
+            self.__add("samplers", {"wrapS": REPEAT, "wrapT": REPEAT})
+
+        image = {"bufferView": self.add_buffer_view(png), "mimeType": "image/png"}
+        if name != None:
+            image["name"] = name
+        return self.__add("textures", {"sampler": 0, "source": self.__add("images", image)})
+
+    def add_material(self, name:str, texture:int=None) -> int:
+        pbr = {"metallicFactor": 0.0}
+        if texture != None:
+            pbr["baseColorTexture"] = {"index": texture}
+        return self.__add("materials", {"name": name, "pbrMetallicRoughness": pbr, "doubleSided": True})
+
+    def add_mesh(self, name:str, primitives:list[dict]) -> int:
+        """A node of the scene with a mesh of the primitives, returns the index of the node."""
+        mesh = self.__add("meshes", {"name": name, "primitives": primitives})
+        node = self.__add("nodes", {"name": name, "mesh": mesh})
+        self.gltf["scenes"][0]["nodes"].append(node)
+        return node
+
+    def write(self, f:typing.BinaryIO):
+        binary = self.buffer.getvalue()
+        # glTF doesn't allow empty lists, leave out the ones that weren't used
+        gltf = {key: value for key, value in self.gltf.items() if not (isinstance(value, list) and len(value) == 0)}
+        if len(binary) > 0:
+            gltf["buffers"] = [{"byteLength": len(binary)}]
+
+        chunks = [(GLB_JSON_CHUNK, padded(json.dumps(gltf, separators=(',', ':')).encode(), b' '))]
+        if len(binary) > 0:
+            chunks.append((GLB_BIN_CHUNK, binary))
+
+        length = GLB_HEADER.size + sum(GLB_CHUNK_HEADER.size + len(data) for _, data in chunks)
+        f.write(GLB_HEADER.pack(GLB_MAGIC, GLB_VERSION, length))
+        for chunk_type, data in chunks:
+            f.write(GLB_CHUNK_HEADER.pack(len(data), chunk_type))
+            f.write(data)
+
+    def save(self, file_path:str):
+        ensure_dir(dirname(file_path))
+        with open(file_path, "wb") as f:
+            self.write(f)
@@ -1,8 +1,26 @@
 from __future__ import annotations
 from typing import NamedTuple, Union
-from struct import pack, unpack, calcsize
+from struct import Struct, error as struct_error
 from os.path import dirname, exists
 from os import makedirs
+from array import array
+from sys import byteorder
+from collections import deque
+from bisect import bisect_left, bisect_right
+from mmap import mmap, ACCESS_READ
+import numpy as np
+
+# the compiled codec from build_native.py is used when it has been built
+try:
+    from _mssb_lz import ffi as _native_ffi, lib as _native_lib
+except ImportError:
+    _native_ffi = _native_lib = None
+
+NATIVE_CODEC_AVAILABLE = _native_lib != None
+USE_NATIVE_CODEC = NATIVE_CODEC_AVAILABLE
+
+NATIVE_NO_MORE_INTS = -1
+NATIVE_BAD_LOOKBACK = -2
 
 class CompressionData(NamedTuple):
     ORIGINAL_DATA = 1
@@ -29,114 +47,431 @@ class CompressionData(NamedTuple):
     def __repr__(self) -> str:
         return self.__str__()
 
-class ArchiveDecompressor:
-    def __init__(self, buffer:bytearray, lookback_bit_count:int, repetition_bit_count:int, original_size:int=None) -> None:
-        self.bytes_to_decompress = bytearray(buffer)
+def max_compressed_size(original_size:int, lookback_bit_count:int, repetition_bit_count:int) -> int:
+    # every token writes at least one byte, a literal costs 9 bits and a repetition writes at least 2 bytes
+    token_bits = 1 + lookback_bit_count + repetition_bit_count
+    bits = original_size * max(9, (token_bits + 1) // 2) + max(9, token_bits)
+    return ((bits + 31) // 32) * 4
+
+class BitReader:
+    # MASKS[n] keeps the low n bits
+    MASKS = tuple((1 << i) - 1 for i in range(33))
+
+    def __init__(self, buffer:bytes, lookback_bit_count:int=0, repetition_bit_count:int=0, max_byte_count:int=None) -> None:
+        self.buffer_length = len(buffer)
+
+        word_count = self.buffer_length // 4
+        if max_byte_count != None:
+            word_count = min(word_count, max_byte_count // 4)
+
+        # unpack every big endian int of the stream once
+        self.words = array('I')
+        self.words.frombytes(memoryview(buffer)[:word_count * 4])
+        if byteorder == 'little':
+            self.words.byteswap()
+        self.word_count = word_count
+
         self.lookback_bit_count = lookback_bit_count
         self.repetition_bit_count = repetition_bit_count
-        self.original_size = original_size
-        self.__reset_buffer()
-    
+        self.lookback_mask = self.MASKS[lookback_bit_count]
+        self.repetition_mask = self.MASKS[repetition_bit_count]
+        self.repetition_shift = 1 + lookback_bit_count
+        self.repetition_token_bits = 1 + lookback_bit_count + repetition_bit_count
+        # a whole token (literal or repetition) can be taken from the buffer without a refill
+        self.fast_token_bits = max(9, self.repetition_token_bits)
+
+        self.reset()
+
+    def reset(self):
+        self.word_index = 0
+        self.bit_buffer = 0
+        self.bits_in_buffer = 0
+
     @property
-    def compressed_size(self):
-        return self.__byte_index
+    def byte_index(self) -> int:
+        return self.word_index * 4
 
-    def __read_int(self)->int:
-        if(self.__byte_index + 3 >= len(self.bytes_to_decompress)):
-            raise ValueError("No more ints to read")
+    def has_bits(self) -> bool:
+        if self.word_index * 4 >= self.buffer_length - 1:
+            return self.bit_buffer != 0
+        return True
 
-        value = int.from_bytes(self.bytes_to_decompress[self.__byte_index : self.__byte_index + 4], 'big')
+    def read_int(self) -> int:
+        if self.word_index >= self.word_count:
+            raise ValueError("No more ints to read")
 
-        self.__byte_index += 4
+        value = self.words[self.word_index]
+        self.word_index += 1
+        return value
 
+    def read_bits(self, bit_count:int) -> int:
+        bits_in_buffer = self.bits_in_buffer
+        # if enough bits in buffer, read the bits from the low end
+        if bit_count <= bits_in_buffer:
+            value = self.bit_buffer & self.MASKS[bit_count]
+            self.bit_buffer >>= bit_count
+            self.bits_in_buffer = bits_in_buffer - bit_count
+            return value
+
+        # else not enough bits, we need a new int
+        new_buffer = self.read_int()
+        new_bits_needed = bit_count - bits_in_buffer
+        # the bits remaining in the buffer will be the high bits for the output data,
+        # the bits we're using from the new data will become the low bits
+        value = (self.bit_buffer << new_bits_needed) | (new_buffer & self.MASKS[new_bits_needed])
+        self.bits_in_buffer = 32 - new_bits_needed
+        self.bit_buffer = new_buffer >> new_bits_needed
         return value
 
-    def __has_bits(self):
-        if self.__byte_index >= len(self.bytes_to_decompress) - 1:
-            return self.__bit_buffer != 0
+    def read_token(self) -> tuple[int, int]:
+        """Reads a flag and its payload in one call.
+
+        Returns (-1, byte) for original data and (look_back, length) for repeated data.
+        """
+        bits_in_buffer = self.bits_in_buffer
+        if bits_in_buffer >= self.fast_token_bits:
+            bit_buffer = self.bit_buffer
+            if bit_buffer & 1:
+                self.bit_buffer = bit_buffer >> 9
+                self.bits_in_buffer = bits_in_buffer - 9
+                return -1, (bit_buffer >> 1) & 0xff
+
+            self.bit_buffer = bit_buffer >> self.repetition_token_bits
+            self.bits_in_buffer = bits_in_buffer - self.repetition_token_bits
+            return (bit_buffer >> 1) & self.lookback_mask, ((bit_buffer >> self.repetition_shift) & self.repetition_mask) + 2
+
+        if self.read_bits(1) == CompressionData.ORIGINAL_DATA:
+            return -1, self.read_bits(8)
+
+        far_back = self.read_bits(self.lookback_bit_count)
+        return far_back, self.read_bits(self.repetition_bit_count) + 2
+
+class StreamMeasurement(NamedTuple):
+    compressed_size: int
+    decompressed_size: int
+
+def measure(stream:bytes, lookback_bit_count:int, repetition_bit_count:int, original_size:int=None) -> StreamMeasurement:
+    """How many compressed bytes a stream uses and how many bytes it decompresses to, without writing any output.
+
+    Stops like ArchiveDecompressor.decompress does, after original_size bytes or when the stream runs out of bits.
+    Raises ValueError for invalid data.
+    """
+    if lookback_bit_count == 0 and repetition_bit_count == 0:
+        size = original_size if original_size != None else len(stream)
+        return StreamMeasurement(size, size)
+
+    max_byte_count = len(stream)
+    if original_size != None:
+        max_byte_count = min(max_byte_count, max_compressed_size(original_size, lookback_bit_count, repetition_bit_count))
+
+    if USE_NATIVE_CODEC:
+        consumed = _native_ffi.new("size_t *")
+        written = _native_ffi.new("size_t *")
+        status = _native_lib.mssb_is_valid(
+            _native_ffi.from_buffer(stream), len(stream), max_byte_count,
+            lookback_bit_count, repetition_bit_count,
+            original_size != None, original_size or 0,
+            consumed, written)
+
+        if status == NATIVE_NO_MORE_INTS:
+            raise ValueError("No more ints to read")
+        if status == NATIVE_BAD_LOOKBACK:
+            raise ValueError("Invalid data, received too far lookback")
+        return StreamMeasurement(consumed[0], written[0])
+
+    reader = BitReader(stream, lookback_bit_count, repetition_bit_count, max_byte_count)
+    read_token = reader.read_token
+    written = 0
+
+    while written < original_size if original_size != None else reader.has_bits():
+        far_back, value = read_token()
+        if far_back < 0:
+            written += 1
+        elif far_back >= written:
+            raise ValueError("Invalid data, received too far lookback")
+        else:
+            written += value
+
+    return StreamMeasurement(reader.byte_index, written)
+
+BIG_ENDIAN_INT = Struct('>I')
+
+def probe_compressed_stream(buffer:bytes, lookback_bit_count:int, repetition_bit_count:int, size:int, offset:int=0, byte_count:int=None) -> bool:
+    """Checks if a compressed stream of at least size bytes could start at buffer[offset:], without writing any output.
+
+    Same answer as is_valid_decompression with original_size=size, but running out of data is False instead of an error.
+    Reads straight from the buffer, so a memoryview into the archive can be probed without a copy.
+    """
+    if size <= 0:
         return True
 
+    available = len(buffer) - offset
+    if byte_count != None:
+        available = min(available, byte_count)
+    word_count = min(available, max_compressed_size(size, lookback_bit_count, repetition_bit_count)) // 4
+    if word_count <= 0:
+        return False
+
+    read_word = BIG_ENDIAN_INT.unpack_from
+    bit_buffer = read_word(buffer, offset)[0]
+    # nothing can be looked back at yet, so the first token has to be original data
+    if not bit_buffer & 1:
+        return False
+
+    masks = BitReader.MASKS
+    lookback_mask = masks[lookback_bit_count]
+    repetition_mask = masks[repetition_bit_count]
+    repetition_shift = 1 + lookback_bit_count
+    token_bits = 1 + lookback_bit_count + repetition_bit_count
+    fast_token_bits = max(9, token_bits)
+
+    bits_in_buffer = 32
+    word_index = 1
+    written = 0
+
+    def read_bits(bit_count:int) -> Union[int, None]:
+        # same as BitReader.read_bits, None when out of data
+        nonlocal bit_buffer, bits_in_buffer, word_index
+        if bit_count <= bits_in_buffer:
+            value = bit_buffer & masks[bit_count]
+            bit_buffer >>= bit_count
+            bits_in_buffer -= bit_count
+            return value
+
+        if word_index >= word_count:
+            return None
+        new_buffer = read_word(buffer, offset + word_index * 4)[0]
+        word_index += 1
+
+        new_bits_needed = bit_count - bits_in_buffer
+        value = (bit_buffer << new_bits_needed) | (new_buffer & masks[new_bits_needed])
+        bits_in_buffer = 32 - new_bits_needed
+        bit_buffer = new_buffer >> new_bits_needed
+        return value
+
+    while written < size:
+        if bits_in_buffer >= fast_token_bits:
+            if bit_buffer & 1:
+                bit_buffer >>= 9
+                bits_in_buffer -= 9
+                written += 1
+                continue
+
+            if ((bit_buffer >> 1) & lookback_mask) >= written:
+                return False
+            written += ((bit_buffer >> repetition_shift) & repetition_mask) + 2
+            bit_buffer >>= token_bits
+            bits_in_buffer -= token_bits
+            continue
+
+        # the token crosses into the next int, read it field by field
+        flag = read_bits(1)
+        if flag == None:
+            return False
+
+        if flag == CompressionData.ORIGINAL_DATA:
+            if read_bits(8) == None:
+                return False
+            written += 1
+            continue
+
+        far_back = read_bits(lookback_bit_count)
+        repetitions = read_bits(repetition_bit_count)
+        if far_back == None or repetitions == None or far_back >= written:
+            return False
+        written += repetitions + 2
+    return True
+
+def probe_compressed_offsets(buffer:bytes, offsets, lookback_bit_count:int, repetition_bit_count:int, size:int, byte_count:int=None) -> np.ndarray:
+    """probe_compressed_stream for many offsets at once, returns a bool for every offset."""
+    if size <= 0:
+        return np.ones(len(np.asarray(offsets).reshape(-1)), dtype=bool)
+    return decode_lengths(buffer, offsets, [(lookback_bit_count, repetition_bit_count)], size, byte_count)[:, 0] >= size
+
+def decode_lengths(buffer:bytes, offsets, formats:list[tuple[int, int]], size:int, byte_count:int=None) -> np.ndarray:
+    """How many bytes every offset decompresses to with every (lookback, repetition) format before its data turns invalid or runs out, at most size.
+
+    Returns an array of shape (offsets, formats). Every offset and format pair is a lane that reads one token per step with numpy,
+    lanes drop out as soon as they are decided, so formats that don't fit cost only a few steps.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    offsets = np.asarray(offsets, dtype=np.int64).reshape(-1)
+    result = np.zeros((len(offsets), len(formats)), dtype=np.int64)
+
+    if size <= 0 or len(formats) == 0:
+        return result
+
+    def read_word(position:np.ndarray) -> np.ndarray:
+        position = position.astype(np.intp)
+        return ((data[position].astype(np.uint64) << np.uint64(24)) | (data[position + 1].astype(np.uint64) << np.uint64(16)) |
+                (data[position + 2].astype(np.uint64) << np.uint64(8)) | data[position + 3].astype(np.uint64))
+
+    # the first token has to be original data whatever the format, so that check is shared
+    starts = np.flatnonzero(len(data) - offsets >= 4)
+    starts = starts[(read_word(offsets[starts]) & np.uint64(1)) == 1]
+
+    lookbacks = np.array([x[0] for x in formats], dtype=np.int64)
+    repetitions_bits = np.array([x[1] for x in formats], dtype=np.int64)
+    max_bytes = np.array([max_compressed_size(size, lb, rb) for lb, rb in formats], dtype=np.int64)
+    if byte_count != None:
+        max_bytes = np.minimum(max_bytes, byte_count)
+
+    # one lane per offset and format
+    lane_offset_index = np.repeat(starts, len(formats))
+    lane_format = np.tile(np.arange(len(formats)), len(starts))
+    offsets = offsets[lane_offset_index]
+    word_count = np.minimum(len(data) - offsets, max_bytes[lane_format]) // 4
+
+    keep = word_count > 0
+    lane_offset_index, lane_format, offsets, word_count = lane_offset_index[keep], lane_format[keep], offsets[keep], word_count[keep]
+    lookback = lookbacks[lane_format]
+    repetition = repetitions_bits[lane_format]
+
+    bit_buffer = np.zeros(len(offsets), dtype=np.uint64)
+    bits_in_buffer = np.zeros(len(offsets), dtype=np.int64)
+    word_index = np.zeros(len(offsets), dtype=np.int64)
+    written = np.zeros(len(offsets), dtype=np.int64)
+
+    def read_bits(bit_count:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        nonlocal bit_buffer, bits_in_buffer, word_index
+
+        needs_word = bit_count > bits_in_buffer
+        out_of_data = needs_word & (word_index >= word_count)
+        reading = needs_word & ~out_of_data
+
+        new_buffer = np.zeros(len(bit_buffer), dtype=np.uint64)
+        new_buffer[reading] = read_word(offsets[reading] + word_index[reading] * 4)
+
+        from_buffer = np.minimum(bit_count, bits_in_buffer).astype(np.uint64)
+        new_bits_needed = np.maximum(bit_count - bits_in_buffer, 0).astype(np.uint64)
+        new_mask = (np.uint64(1) << new_bits_needed) - np.uint64(1)
+
+        value = np.where(needs_word,
+            (bit_buffer << new_bits_needed) | (new_buffer & new_mask),
+            bit_buffer & ((np.uint64(1) << from_buffer) - np.uint64(1)))
+        bit_buffer = np.where(needs_word, new_buffer >> new_bits_needed, bit_buffer >> from_buffer)
+        bits_in_buffer = np.where(needs_word, 32 - new_bits_needed.astype(np.int64), bits_in_buffer - bit_count)
+        word_index = word_index + reading
+        return value.astype(np.int64), out_of_data
+
+    while len(offsets) > 0:
+        flag, out_of_data = read_bits(np.ones(len(offsets), dtype=np.int64))
+        original = flag == CompressionData.ORIGINAL_DATA
+
+        # original data reads a byte and no repetition bits
+        far_back, more_out_of_data = read_bits(np.where(original, 8, lookback))
+        out_of_data |= more_out_of_data
+        repetitions, more_out_of_data = read_bits(np.where(original, 0, repetition))
+        out_of_data |= more_out_of_data
+
+        invalid = out_of_data | (~original & (far_back >= written))
+        written = np.where(invalid, written, written + np.where(original, 1, repetitions + 2))
+        finished = invalid | (written >= size)
+        result[lane_offset_index[finished], lane_format[finished]] = np.minimum(written[finished], size)
+
+        keep = ~finished
+        lane_offset_index, lane_format, offsets, word_count = lane_offset_index[keep], lane_format[keep], offsets[keep], word_count[keep]
+        lookback, repetition = lookback[keep], repetition[keep]
+        bit_buffer, bits_in_buffer, word_index, written = bit_buffer[keep], bits_in_buffer[keep], word_index[keep], written[keep]
+
+    return result
+
+class ArchiveDecompressor:
+    def __init__(self, buffer:bytearray, lookback_bit_count:int, repetition_bit_count:int, original_size:int=None) -> None:
+        # only read from, so a memoryview into the archive works without a copy
+        self.bytes_to_decompress = buffer
+        self.lookback_bit_count = lookback_bit_count
+        self.repetition_bit_count = repetition_bit_count
+        self.original_size = original_size
+
+        self.max_byte_count = len(self.bytes_to_decompress)
+        if original_size != None:
+            self.max_byte_count = min(self.max_byte_count, max_compressed_size(original_size, lookback_bit_count, repetition_bit_count))
+        self.reader = BitReader(self.bytes_to_decompress, lookback_bit_count, repetition_bit_count, self.max_byte_count)
+
+    @property
+    def compressed_size(self):
+        return self.reader.byte_index
+
     def __should_keep_decompressing(self, size:int):
         if self.original_size != None:
             return size < self.original_size
-        return self.__has_bits()
-
-    def __read_bits(self, bit_count:int):
-        # if enough bits in buffer
-        if bit_count <= self.__bits_in_buffer:
-            # read the bits from the low end
-            value = self.__bit_buffer & (2**bit_count - 1)
-            # rotate out the bits
-            self.__bit_buffer >>= bit_count
-            # remove the count of those bits
-            self.__bits_in_buffer -= bit_count
+        return self.reader.has_bits()
+
+    def __native_walk(self, output:bytearray=None) -> tuple[int, int]:
+        consumed = _native_ffi.new("size_t *")
+        written = _native_ffi.new("size_t *")
+        source = _native_ffi.from_buffer(self.bytes_to_decompress)
+
+        if output == None:
+            status = _native_lib.mssb_is_valid(
+                source, len(self.bytes_to_decompress), self.max_byte_count,
+                self.lookback_bit_count, self.repetition_bit_count,
+                self.original_size != None, self.original_size or 0,
+                consumed, written)
         else:
-            # else not enough bits,
-            # we need a new int
-            new_buffer = self.__read_int()
-            
-            new_bits_needed = bit_count - self.__bits_in_buffer
-            # the bits remaining in the buffer will be the high bits for the output data
-            value = self.__bit_buffer << new_bits_needed
+            status = _native_lib.mssb_decompress(
+                source, len(self.bytes_to_decompress), self.max_byte_count,
+                self.lookback_bit_count, self.repetition_bit_count, self.original_size,
+                _native_ffi.from_buffer(output), len(output),
+                consumed, written)
 
-            self.__bits_in_buffer = 32 - new_bits_needed
-            # the bits we're using from the new data will become the low bits of the output data
-            value |= (new_buffer & (0xffffffff >> self.__bits_in_buffer))
-            # rotate out the data
-            self.__bit_buffer = new_buffer >> new_bits_needed
+        self.reader.reset()
+        self.reader.word_index = consumed[0] // 4
 
-        return value
-    
-    def __reset_buffer(self):
-        self.__byte_index = 0
-        self.__bit_buffer = 0
-        self.__bits_in_buffer = 0
+        if status == NATIVE_NO_MORE_INTS:
+            raise ValueError("No more ints to read")
+        return status, written[0]
 
     def is_valid_decompression(self) -> bool:
         if self.lookback_bit_count == 0 and self.repetition_bit_count == 0:
             return True
-        
-        self.__reset_buffer()
+
+        if USE_NATIVE_CODEC:
+            status, _ = self.__native_walk()
+            return status != NATIVE_BAD_LOOKBACK
+
+        reader = self.reader
+        reader.reset()
 
         written_bit_count = 0
 
         while self.__should_keep_decompressing(written_bit_count):
-            # returns 0 or 1
-            head_bit = self.__read_bits(1)
-            if head_bit == 0:                
-                far_back = self.__read_bits(self.lookback_bit_count)
-                repetitions = self.__read_bits(self.repetition_bit_count) + 2
-                if far_back >= written_bit_count:
-                    # if there is a sequence requested to be read that is before the start of the array, then stop
-                    return False
-                written_bit_count += repetitions
-            else:
-                self.__read_bits(8)
+            far_back, value = reader.read_token()
+            if far_back < 0:
                 written_bit_count += 1
+            elif far_back >= written_bit_count:
+                # if there is a sequence requested to be read that is before the start of the array, then stop
+                return False
+            else:
+                written_bit_count += value
         return True
-    
+
+    def measure_compressed_size(self) -> int:
+        """The compressed size decompress would find, without writing any output."""
+        return measure(self.bytes_to_decompress, self.lookback_bit_count, self.repetition_bit_count, self.original_size).compressed_size
+
     def get_compression_instructions(self) -> list[CompressionData]:
         if self.lookback_bit_count == 0 and self.repetition_bit_count == 0:
             return []
-        
-        self.__reset_buffer()
+
+        reader = self.reader
+        reader.reset()
 
         written_bit_count = 0
         instructions = []
         while self.__should_keep_decompressing(written_bit_count):
-            # returns 0 or 1
-            head_bit = self.__read_bits(1)
-            if head_bit == 0:                
-                far_back = self.__read_bits(self.lookback_bit_count)
-                length = self.__read_bits(self.repetition_bit_count) + 2
+            far_back, value = reader.read_token()
+            if far_back < 0:
+                instructions.append(CompressionData(flag=CompressionData.ORIGINAL_DATA, data=value))
+                length = 1
+            else:
+                length = value
                 if far_back > written_bit_count:
                     # if there is a sequence requested to be read that is before the start of the array, then stop
                     raise ValueError("Invalid data, received too far lookback")
 
-                instructions.append(CompressionData(flag=head_bit, look_back=far_back, length=length))
-            else:
-                instructions.append(CompressionData(flag=head_bit, data=self.__read_bits(8)))
-                length = 1
+                instructions.append(CompressionData(flag=CompressionData.REPETITION_DATA, look_back=far_back, length=length))
 
             written_bit_count += length
         return instructions
@@ -144,33 +479,65 @@ class ArchiveDecompressor:
     def decompress(self):
         if self.lookback_bit_count == 0 and self.repetition_bit_count == 0:
             if self.original_size != None:
-                return self.bytes_to_decompress[:self.original_size]
+                return bytearray(self.bytes_to_decompress[:self.original_size])
             else:
                 return bytearray()
-        
-        self.__reset_buffer()
-
-        final_data = bytearray()
 
-        while self.__should_keep_decompressing(len(final_data)):
-            # returns 0 or 1
-            head_bit = self.__read_bits(1)
-            if head_bit == CompressionData.REPETITION_DATA:
-
-                far_back = self.__read_bits(self.lookback_bit_count)
-                
-                repetitions = self.__read_bits(self.repetition_bit_count) + 2
-
-                if far_back > len(final_data):
-                    # if there is a sequence requested to be read that is before the start of the array, then stop
-                    raise ValueError("Invalid data, received too far lookback")
-                while repetitions != 0:
-                    final_data.append(final_data[-1 - far_back])
-                    repetitions -= 1
+        original_size = self.original_size
+
+        if USE_NATIVE_CODEC and original_size != None:
+            # room for the last run to go past the original size
+            output = bytearray(original_size + (1 << self.repetition_bit_count) + 1)
+            status, written = self.__native_walk(output)
+            if status == NATIVE_BAD_LOOKBACK:
+                raise ValueError("Invalid data, received too far lookback")
+            del output[written:]
+            return output
+
+        reader = self.reader
+        reader.reset()
+        read_token = reader.read_token
+        has_bits = reader.has_bits
+
+        # preallocate the output when the size is known, runs are copied into it with slices
+        output = bytearray(original_size) if original_size != None else bytearray(reader.buffer_length * 2)
+        output_size = len(output)
+        write_index = 0
+
+        while (write_index < original_size) if original_size != None else has_bits():
+            far_back, value = read_token()
+
+            if far_back < 0:
+                if write_index >= output_size:
+                    output.extend(bytes(output_size + 1))
+                    output_size = len(output)
+                output[write_index] = value
+                write_index += 1
+                continue
+
+            if far_back >= write_index:
+                # if there is a sequence requested to be read that is before the start of the array, then stop
+                raise ValueError("Invalid data, received too far lookback")
+
+            run_end = write_index + value
+            if run_end > output_size:
+                # the last run is allowed to write past the original size
+                output.extend(bytes(max(run_end - output_size, output_size if original_size == None else 0)))
+                output_size = len(output)
+
+            distance = far_back + 1
+            run_start = write_index - distance
+            if distance >= value:
+                # the whole run is already decoded, copy it in one go
+                output[write_index:run_end] = output[run_start:run_start + value]
             else:
-                final_data.append(self.__read_bits(8))
+                # the run overlaps itself, the last `distance` bytes repeat until the run is filled
+                pattern = output[run_start:write_index]
+                output[write_index:run_end] = (pattern * (value // distance + 1))[:value]
+            write_index = run_end
 
-        return final_data
+        del output[write_index:]
+        return output
 
 class ArchiveCompressor:
     class CompressedBufferHelper:
@@ -241,180 +608,122 @@ class ArchiveCompressor:
         offset:int
         length:int
 
+    class MatchFinder:
+        """Finds the first longest match for a position inside the sliding window.
+
+        Every earlier position is bucketed by its 3 byte and 2 byte prefix, oldest first.
+        A match of 3 or more bytes can only start in the 3 byte bucket, so only that bucket
+        is compared. When nothing there is long enough, the best match is 2 bytes long,
+        and the first one is the oldest entry of the 2 byte bucket.
+        """
+        MIN_LENGTH = 2
+
+        def __init__(self, data:bytearray, window_size:int, max_length:int) -> None:
+            self.data = data
+            self.window_size = window_size
+            self.max_length = max_length
+
+            self.pairs:dict[int, deque[int]] = {}
+            self.triples:dict[int, deque[int]] = {}
+            self.inserted = 0
+
+        def insert_until(self, stop:int):
+            data = self.data
+            pairs = self.pairs
+            triples = self.triples
+            pair_stop = min(stop, len(data) - 1)
+            triple_stop = min(stop, len(data) - 2)
+
+            for index in range(self.inserted, pair_stop):
+                key = (data[index] << 8) | data[index + 1]
+                bucket = pairs.get(key)
+                if bucket == None:
+                    pairs[key] = deque((index,))
+                else:
+                    bucket.append(index)
+
+                if index < triple_stop:
+                    key = (key << 8) | data[index + 2]
+                    bucket = triples.get(key)
+                    if bucket == None:
+                        triples[key] = deque((index,))
+                    else:
+                        bucket.append(index)
+
+            self.inserted = max(self.inserted, stop)
+
+        def find(self, index:int) -> ArchiveCompressor.SublistDefinition:
+            data = self.data
+            longest = min(self.max_length, len(data) - index)
+            if longest < self.MIN_LENGTH:
+                return None
+
+            self.insert_until(index)
+            window_start = index - self.window_size
+
+            key = (data[index] << 8) | data[index + 1]
+            if longest > self.MIN_LENGTH:
+                bucket = self.triples.get((key << 8) | data[index + 2])
+                if bucket:
+                    # positions that left the window never come back
+                    while bucket and bucket[0] < window_start:
+                        bucket.popleft()
+
+                    best_length = 0
+                    best_offset = -1
+                    for offset in bucket:
+                        # only a longer match can replace the first one found
+                        if best_length and data[offset + best_length] != data[index + best_length]:
+                            continue
+
+                        length = 3
+                        while length < longest and data[offset + length] == data[index + length]:
+                            length += 1
+
+                        if length > best_length:
+                            best_length = length
+                            best_offset = offset
+                            if length == longest:
+                                break
+
+                    if best_length:
+                        return ArchiveCompressor.SublistDefinition(best_offset, best_length)
+
+            bucket = self.pairs.get(key)
+            if bucket:
+                while bucket and bucket[0] < window_start:
+                    bucket.popleft()
+                if bucket:
+                    return ArchiveCompressor.SublistDefinition(bucket[0], self.MIN_LENGTH)
+            return None
+
     def __init__(self, data:bytearray, lookback_bit_size:int, repetition_bit_size:int) -> None:
         self.data = bytearray(data)
         self.lookback_bit_size = lookback_bit_size
         self.repetition_bit_size = repetition_bit_size
 
-        self.cached_data = {}
-
-    # function to help get the count of the matching characters
-    def __length_of_match(data:bytearray, sublist:bytearray):
-        count = 0
-        while count < len(sublist) and (sublist[count] == data[count]):
-            count += 1
-        return count
-
-    def __largest_sublist_cachedsearch(self, sub_start: int, sub_stop: int, sliding_window_start_index: int, sliding_window_stop_index: int, look_ahead_size: int, min_sublist_size:int):
-        sliding_window_size = sliding_window_stop_index - sliding_window_start_index
-
-        sublist = self.data[sub_start:sub_stop]
-        
-        first_char = sublist[0]
-
-        cached_ind_set:list = self.cached_data.get(first_char, None)
-        if cached_ind_set != None:
-            to_remove = []
-            match_length = -1
-            match_index = -1
-
-            for cached_ind in cached_ind_set:
-                if cached_ind < (sub_start - sliding_window_size):
-                    to_remove.append(cached_ind)
-                    continue
-
-                len_of_match = ArchiveCompressor.__length_of_match(self.data[cached_ind:cached_ind+sub_stop-sub_start], sublist)
-
-                if len_of_match > match_length:
-                    match_length = len_of_match
-                    match_index = cached_ind
-                
-            cached_ind_set.append(sub_start)
-            for rem in to_remove:
-                cached_ind_set.remove(rem)
-
-            for sublist_index in range(1, match_length):
-                char = sublist[sublist_index]
-                char_ind = sub_start + sublist_index
-                
-                cached_ind_set = self.cached_data.get(char, None)
-                if cached_ind_set == None:
-                    cached_ind_set = set()
-                    self.cached_data[char] = cached_ind_set
-
-                cached_ind_set.append(char_ind)
-            
-            if match_length >= min_sublist_size:
-                return self.SublistDefinition(match_index, match_length)
-        else:
-            self.cached_data[first_char] = [sub_start]
-
-        return None
-    
-    def __largest_sublist_bytesearch(self, sub_start: int, sub_stop: int, sliding_window_start_index: int, sliding_window_stop_index: int, look_ahead_size: int, min_sublist_size:int) -> SublistDefinition:
-
-        sub_start                   = max(0, sub_start)
-        sliding_window_start_index  = max(0, sliding_window_start_index)
-
-        dat_len                     = len(self.data)
-
-        sub_stop                    = min(dat_len, sub_stop)
-        sliding_window_stop_index   = min(dat_len, sliding_window_stop_index)
-
-        sublist = self.data[sub_start:sub_stop]
-
-        
-        # -------- bytearray built-in find ----------- 2.5 seconds
-
-        # size of sliding window | first offset that is unacceptable
-        unusable_lookahead_ind = sliding_window_stop_index - sliding_window_start_index
-        # cut sliding window and lookahead to search in
-        sliding_window_and_lookahead = self.data[sliding_window_start_index : sliding_window_stop_index + look_ahead_size]
-        # only look for sublists for sizes above min_sublist_size
-        while len(sublist) >= min_sublist_size:
-            # finds first instance, returns >= 0 if found, else -1
-            ind = sliding_window_and_lookahead.find(sublist)
-            # checks to see if any found and first instance is not in the lookahead
-            if 0 <= ind < unusable_lookahead_ind:
-                # return offset into large array
-                return self.SublistDefinition(sliding_window_start_index + ind, len(sublist))
-            # cut down list to look for smaller sublist
-            sublist = sublist[:-1]
-        # nothing found
-        return None
-        
-        # -----------------------------------
-
-    def __largest_sublist_search(self, sub_start: int, sub_stop: int, sliding_window_start_index: int, sliding_window_stop_index: int, look_ahead_size: int, min_sublist_size:int) -> SublistDefinition:
-
-        sub_start                   = max(0, sub_start)
-        sliding_window_start_index  = max(0, sliding_window_start_index)
-
-        dat_len                     = len(self.data)
-
-        sub_stop                    = min(dat_len, sub_stop)
-        sliding_window_stop_index   = min(dat_len, sliding_window_stop_index)
-
-        sublist = self.data[sub_start:sub_stop]
-        
-        # ----------------- Iterate ------------------ 30 seconds
-        # max_length = len(sublist)
-        # best_index = -1
-        # best_length = -1
-
-        # # walk through every index in the sliding window
-        # for compare_index in range(sliding_window_start_index, sliding_window_stop_index):
-
-        #     # check to see how many values in the sublist match at this index
-        #     sub_count = 0
-        #     while sub_count < max_length and self.data[compare_index + sub_count] == sublist[sub_count]:
-        #         sub_count += 1
-            
-        #     # record it if it was better than the previous best found
-        #     if sub_count > best_length:
-        #         best_index = compare_index
-        #         best_length = sub_count
-
-        # # only return sublist if it meets the min sublist requirement
-        # if best_length >= min_sublist_size:
-        #     return self.SublistDefinition(offset=best_index, length=best_length)
-        # return None
-        # -----------------------------------
-
-        # ----------------- look for first char ------ 13 seconds
-        sliding_window = self.data[sliding_window_start_index:sliding_window_stop_index]
-
-        first_char = sublist[0]
-        # retrive the indices of all times the first character of the sublist exists in the sliding window
-        all_first_char_inds = [ind for (ind, v) in enumerate(sliding_window) if v == first_char]
-
-
-        # loop over the indices, and figure out how many characters match the sublist
-        all_lengths = [(ArchiveCompressor.__length_of_match(self.data[sliding_window_start_index + ind : sliding_window_start_index + ind + len(sublist)], sublist), ind) for ind in all_first_char_inds]
-        
-        # if no matches are found, return None
-        if len(all_lengths) == 0:
-            return None
-
-        # have to choose 1 of the found, choose the first instance of longest length
-        best_length = max([x[0] for x in all_lengths])
-
-        # if best length isn't long enough, return none
-        if best_length < min_sublist_size:
-            return None
-
-        best_index = min([x[1] for x in all_lengths if x[0] == best_length])
-        return self.SublistDefinition(sliding_window_start_index + best_index, best_length)
-        # -----------------------------------
-
     def compress(self) -> bytearray:
-        self.cached_data    = {}
+        if USE_NATIVE_CODEC:
+            output = bytearray(max_compressed_size(len(self.data), self.lookback_bit_size, self.repetition_bit_size))
+            length = _native_lib.mssb_compress(
+                _native_ffi.from_buffer(self.data), len(self.data),
+                self.lookback_bit_size, self.repetition_bit_size,
+                _native_ffi.from_buffer(output), len(output))
+            if length < 0:
+                raise MemoryError("Native compressor failed")
+            del output[length:]
+            return output
+
         data_index          = 0
         look_back_size      = 2**self.lookback_bit_size
         repetitions_size    = 2**self.repetition_bit_size + 1
 
+        match_finder = self.MatchFinder(self.data, look_back_size, repetitions_size)
+
         buffer = self.CompressedBufferHelper()
         while data_index < len(self.data):
-                        
-            longest_match = self.__largest_sublist_bytesearch(
-                    sub_start                   = data_index,
-                    sub_stop                    = data_index + repetitions_size,
-                    min_sublist_size            = 2,
-
-                    sliding_window_start_index  = data_index - look_back_size,
-                    sliding_window_stop_index   = data_index,
-                    look_ahead_size             = repetitions_size,
-                )
+
+            longest_match = match_finder.find(data_index)
 
             if longest_match != None:
                 #longest_match.offset is just an index into the array, we actually want to have it become a lookback from the data_index
@@ -434,78 +743,90 @@ class ArchiveCompressor:
 
 class RollingDecompressor():
     MAX_SIZE = 4_000_000 # 4 mb max size
+    CHUNK_SIZE = 0x10000
 
-    def __init__(self, buffer:bytearray, lookback_bit_count:int, repetition_bit_count:int) -> None:
-        self.bytes_to_decompress = bytearray(buffer)
+    def __init__(self, buffer:bytearray, lookback_bit_count:int, repetition_bit_count:int, keep_output:bool=True) -> None:
+        self.bytes_to_decompress = buffer
         self.lookback_bit_count = lookback_bit_count
         self.repetition_bit_count = repetition_bit_count
-        self.__reset_buffer()
-        self.outputdata = bytearray()
-    
-    def __read_int(self)->int:
-        if(self.__byte_index + 3 >= len(self.bytes_to_decompress)):
-            raise ValueError("No more ints to read")
+        self.reader = BitReader(self.bytes_to_decompress, lookback_bit_count, repetition_bit_count, max_compressed_size(RollingDecompressor.MAX_SIZE, lookback_bit_count, repetition_bit_count))
 
-        value = int.from_bytes(self.bytes_to_decompress[self.__byte_index : self.__byte_index + 4], 'big')
-
-        self.__byte_index += 4
+        # when keep_output is False only the last window_size bytes are kept, that is as far back as a token can copy from
+        self.keep_output = keep_output
+        self.window_size = 2**lookback_bit_count
+        self.outputdata = bytearray()
+        self.output_start = 0 # position in the stream of outputdata[0]
+        self.end_of_stream = False
 
-        return value
+    @property
+    def decoded_size(self) -> int:
+        return self.output_start + len(self.outputdata)
 
     def __len__(self):
-        return 2**32-1
-
-    def __read_bits(self, bit_count:int):
-        # if enough bits in buffer
-        if bit_count <= self.__bits_in_buffer:
-            # read the bits from the low end
-            value = self.__bit_buffer & (2**bit_count - 1)
-            # rotate out the bits
-            self.__bit_buffer >>= bit_count
-            # remove the count of those bits
-            self.__bits_in_buffer -= bit_count
-        else:
-            # else not enough bits,
-            # we need a new int
-            new_buffer = self.__read_int()
-            
-            new_bits_needed = bit_count - self.__bits_in_buffer
-            # the bits remaining in the buffer will be the high bits for the output data
-            value = self.__bit_buffer << new_bits_needed
-
-            self.__bits_in_buffer = 32 - new_bits_needed
-            # the bits we're using from the new data will become the low bits of the output data
-            value |= (new_buffer & (0xffffffff >> self.__bits_in_buffer))
-            # rotate out the data
-            self.__bit_buffer = new_buffer >> new_bits_needed
-
-        return value
-    
-    def __reset_buffer(self):
-        self.__byte_index = 0
-        self.__bit_buffer = 0
-        self.__bits_in_buffer = 0
+        # only what has been decoded so far, indexing past it decodes more
+        return self.decoded_size
 
     def decompress(self, size:int):
-        while len(self.outputdata) < size and len(self.outputdata) < RollingDecompressor.MAX_SIZE:
-            # returns 0 or 1
-            head_bit = self.__read_bits(1)
-            if head_bit == CompressionData.REPETITION_DATA:
+        read_token = self.reader.read_token
+        output = self.outputdata
+        output_start = self.output_start
+        size = min(size, RollingDecompressor.MAX_SIZE)
+
+        while not self.end_of_stream and output_start + len(output) < size:
+            try:
+                far_back, value = read_token()
+            except ValueError: # ran out of compressed data
+                self.end_of_stream = True
+                break
+
+            if far_back < 0:
+                output.append(value)
+                continue
+
+            write_index = len(output)
+            if far_back >= output_start + write_index:
+                # if there is a sequence requested to be read that is before the start of the array, then stop
+                raise ValueError("Invalid data, received too far lookback")
+
+            distance = far_back + 1
+            run_start = write_index - distance
+            if distance >= value:
+                output += output[run_start:run_start + value]
+            else:
+                pattern = output[run_start:write_index]
+                output += (pattern * (value // distance + 1))[:value]
 
-                far_back = self.__read_bits(self.lookback_bit_count)
-                
-                repetitions = self.__read_bits(self.repetition_bit_count) + 2
+        if self.decoded_size >= RollingDecompressor.MAX_SIZE:
+            self.end_of_stream = True
 
-                if far_back > len(self.outputdata):
-                    # if there is a sequence requested to be read that is before the start of the array, then stop
-                    raise ValueError("Invalid data, received too far lookback")
-                while repetitions != 0:
-                    self.outputdata.append(self.outputdata[-1 - far_back])
-                    repetitions -= 1
-            else:
-                self.outputdata.append(self.__read_bits(8))
+        return output
+
+    def iter_chunks(self, chunk_size:int=None):
+        """Decodes and yields chunk_size bytes at a time until the end of the stream."""
+        chunk_size = chunk_size if chunk_size != None else RollingDecompressor.CHUNK_SIZE
+        position = self.output_start
 
-        return self.outputdata
+        while True:
+            self.decompress(position + chunk_size)
+            end = min(position + chunk_size, self.decoded_size)
+            if end <= position:
+                return
+
+            yield bytes(self.outputdata[position - self.output_start : end - self.output_start])
+            position = end
+
+            if not self.keep_output:
+                self.__drop_output(position - self.window_size)
+
+    def __drop_output(self, position:int):
+        if position > self.output_start:
+            del self.outputdata[:position - self.output_start]
+            self.output_start = position
+
+    def __to_output_index(self, index:int) -> int:
+        if index < self.output_start:
+            raise IndexError(f"Byte {index} was dropped, only the last {self.window_size} bytes are kept")
+        return index - self.output_start
     
     class RollingDecompressorSlice:
         def __init__(self, d:RollingDecompressor, s:slice) -> None:
@@ -514,20 +835,19 @@ class RollingDecompressor():
             self.__slice = s
         
         def __getitem__(self, key):
+            my_start   = self.__slice.start if self.__slice.start != None else 0
+            my_step    = self.__slice.step  if self.__slice.step  != None else 1
+
             if isinstance(key, int):
                 assert(key >= 0)
                 
-                self.__rolling_decompressor.decompress(max(self.__slice.start, self.__slice.stop))
-                return self.__rolling_decompressor.outputdata[self.__slice.start:self.__slice.stop:self.__slice.step][key]
+                return self.__rolling_decompressor[my_start + key * my_step]
             
             elif isinstance(key, slice):
                 assert(key.step == None or key.step > 0)
                 assert(key.start == None or key.start >= 0)
                 assert(key.stop == None or key.stop >= 0)
 
-                my_start   = self.__slice.start if self.__slice.start != None else 0
-                my_step    = self.__slice.step  if self.__slice.step  != None else 1
-
                 this_start = key.start if key.start != None else 0
                 this_step  = key.step  if key.step  != None else 1
 
@@ -535,9 +855,7 @@ class RollingDecompressor():
 
                     total_start = this_start + my_start
                     total_end = total_start + max((key.stop - this_start) * my_step, 0)
-                    self.__rolling_decompressor.decompress(max(total_start, total_end))
-
-                    return self.__rolling_decompressor.outputdata[total_start : total_end : this_step * my_step]
+                    return self.__rolling_decompressor[total_start : total_end : this_step * my_step]
             
                 elif key.stop == None: # no stop defined
                     
@@ -546,14 +864,18 @@ class RollingDecompressor():
             raise ValueError(f"Unexpected key: {type(key)}: {key}")
 
         def __len__(self):
-            return len(self.__rolling_decompressor)
+            my_start   = self.__slice.start if self.__slice.start != None else 0
+            my_step    = self.__slice.step  if self.__slice.step  != None else 1
+            return max(0, -(-(len(self.__rolling_decompressor) - my_start) // my_step))
                     
     def __getitem__(self, key):
         if isinstance(key, int):
             assert(key >= 0)
             
             self.decompress(key+1)
-            return self.outputdata[key]
+            if key >= self.decoded_size:
+                raise IndexError(f"Byte {key} is past the end of the stream ({self.decoded_size} bytes)")
+            return self.outputdata[self.__to_output_index(key)]
 
         elif isinstance(key, slice):
             assert(key.step == None or key.step > 0)
@@ -566,65 +888,144 @@ class RollingDecompressor():
                 this_start = key.start if key.start != None else 0
                 
                 self.decompress(max(this_start, key.stop))
-                return self.outputdata[this_start:key.stop:key.step] # return data between start and stop
+                this_start = self.__to_output_index(min(this_start, self.decoded_size))
+                this_stop = max(key.stop - self.output_start, this_start)
+                return self.outputdata[this_start:this_stop:key.step] # return data between start and stop
                         
             return RollingDecompressor.RollingDecompressorSlice(self, key) # if no stop defined
         raise ValueError(f"Unexpected key: {type(key)}: {key}")
     
 class DataBytesInterpreter:
+    __slots__ = ()
+
+    # made once for every subclass with a DATA_FORMAT
+    STRUCT:Struct = None
+    SIZE_OF_STRUCT:int = None
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        if 'DATA_FORMAT' in cls.__dict__:
+            cls.STRUCT = Struct(cls.DATA_FORMAT)
+            cls.SIZE_OF_STRUCT = cls.STRUCT.size
+
     @classmethod
-    @property
-    def SIZE_OF_STRUCT(cls):
-        return calcsize(cls.DATA_FORMAT)
+    def __view(cls, all_bytes:bytearray, offset:int, size:int):
+        # the bytes without copying them where possible, RollingDecompressor only supports slicing
+        try:
+            these_bytes = memoryview(all_bytes).cast('B')[offset:offset+size] if offset >= 0 else b''
+        except TypeError:
+            these_bytes = all_bytes[offset:offset+size]
+
+        if len(these_bytes) != size:
+            raise ValueError(f'Ran out of bytes to interpret in {cls.__name__}, needed {size}, received {len(these_bytes)}')
+        return these_bytes
 
     @classmethod
-    def parse_bytes_static(cls, all_bytes:bytearray, offset:int, format_str:str):
-        struct_size = calcsize(format_str)
-        these_bytes = all_bytes[offset:offset+struct_size]
+    def parse_bytes_static(cls, all_bytes:bytearray, offset:int, format_str:str=None) -> tuple:
+        parser = cls.STRUCT if format_str == None or format_str == cls.DATA_FORMAT else Struct(format_str)
+        if offset >= 0:
+            try:
+                return parser.unpack_from(all_bytes, offset)
+            except TypeError:
+                pass # not a buffer
+            except struct_error:
+                pass # too short, the error is raised below
+        return parser.unpack(cls.__view(all_bytes, offset, parser.size))
+
+    def parse_bytes(self, all_bytes:bytearray, offset:int) -> tuple:
+        return self.parse_bytes_static(all_bytes, offset)
 
-        if len(these_bytes) != struct_size:
-            raise ValueError(f'Ran out of bytes to interpret in {cls.__class__.__name__}, needed {cls.SIZE_OF_STRUCT}, received {len(these_bytes)}')
+    @classmethod
+    def unpack_many(cls, all_bytes:bytearray, offset:int, count:int) -> list[tuple]:
+        """The fields of count records one after another from offset."""
+        return list(cls.STRUCT.iter_unpack(cls.__view(all_bytes, offset, count * cls.SIZE_OF_STRUCT)))
 
-        return unpack(format_str, these_bytes)
+    @classmethod
+    def parse_many(cls, all_bytes:bytearray, offset:int, count:int) -> list:
+        """count records one after another from offset, for the classes made from (bytes, offset)."""
+        these_bytes = cls.__view(all_bytes, offset, count * cls.SIZE_OF_STRUCT)
+        return [cls(these_bytes, i * cls.SIZE_OF_STRUCT) for i in range(count)]
 
-    def parse_bytes(self, all_bytes:bytearray, offset:int):
-        return self.parse_bytes_static(all_bytes, offset, self.DATA_FORMAT)
-        
 class DataEntry(DataBytesInterpreter):
     DATA_FORMAT = ">xxBBIII"
+    # the same record for numpy, to read many at once
+    RECORD_DTYPE = np.dtype([('padding', '>u2'), ('repetition', 'u1'), ('lookback', 'u1'), ('original_size', '>u4'), ('disk_location', '>u4'), ('compressed_size', '>u4')])
+
+    # discovery makes tens of thousands of these
+    __slots__ = ('file', 'lookback_bit_size', 'repetition_bit_size', 'original_size', '_disk_location', '_compressed_size', 'compression_flag', '_output_name', '_footer_size')
+
+    def __init__(self, file:str="", lookback_bit_size:int=0, repetition_bit_size:int=0, original_size:int=0, disk_location:int=0, compressed_size:int=0, compression_flag:int=0, output_name:str=None) -> None:
+        self.file = file
+        self.lookback_bit_size = lookback_bit_size
+        self.repetition_bit_size = repetition_bit_size
+        self.original_size = original_size
+        self._disk_location = disk_location
+        self._compressed_size = compressed_size
+        self.compression_flag = compression_flag
+        # None is the default name, only made when it is asked for
+        self._output_name = output_name
+        self._footer_size = None
+
+    def from_bytes(b:bytearray, offset:int, file="") -> DataEntry:
+        """The entry of the game's record at b[offset:]."""
+        repetition_bit_size, lookback_bit_size, original_size, disk_location, compressed_size = DataEntry.parse_bytes_static(b, offset)
+        return DataEntry(file, lookback_bit_size, repetition_bit_size, original_size & 0xf_ff_ff_ff, disk_location, compressed_size, original_size >> 28)
+
+    def from_bytes_many(b:bytearray, offsets:np.ndarray, file="") -> list[DataEntry]:
+        """from_bytes for every offset, the records are read with numpy."""
+        data = np.frombuffer(b, dtype=np.uint8)
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1)
+        records = data[offsets[:, None] + np.arange(DataEntry.RECORD_DTYPE.itemsize)].view(DataEntry.RECORD_DTYPE).reshape(-1)
+        return DataEntry.from_fields(file, records['lookback'], records['repetition'], records['original_size'], records['disk_location'], records['compressed_size'])
+
+    def from_fields(file:str, lookback_bit_sizes, repetition_bit_sizes, original_sizes, disk_locations, compressed_sizes) -> list[DataEntry]:
+        """Entries from arrays of record fields, the original sizes still have the compression flag in their top bits."""
+        original_sizes = np.asarray(original_sizes, dtype=np.int64)
+        return [DataEntry(file, *fields) for fields in zip(
+            np.asarray(lookback_bit_sizes).tolist(),
+            np.asarray(repetition_bit_sizes).tolist(),
+            (original_sizes & 0xf_ff_ff_ff).tolist(),
+            np.asarray(disk_locations).tolist(),
+            np.asarray(compressed_sizes).tolist(),
+            (original_sizes >> 28).tolist())]
 
     @property
-    def footer_size(self):
-        base = 0x800
-        size = self.disk_location + self.compressed_size
-        size %= base
-        if size == 0:
-            footer = 0
-        else:
-            footer = base - size
-        
-        return footer
+    def disk_location(self) -> int:
+        return self._disk_location
 
-    def __init__(self, b: bytearray, offset:int, file="") -> None:
+    @disk_location.setter
+    def disk_location(self, value:int):
+        self._disk_location = value
+        self._footer_size = None
 
-        self.file = file
-        self.repetition_bit_size,\
-        self.lookback_bit_size,\
-        self.original_size,\
-        self.disk_location,\
-        self.compressed_size =\
-        self.parse_bytes(b, offset)
+    @property
+    def compressed_size(self) -> int:
+        return self._compressed_size
+
+    @compressed_size.setter
+    def compressed_size(self, value:int):
+        self._compressed_size = value
+        self._footer_size = None
 
-        self.compression_flag = self.original_size >> 28
+    @property
+    def footer_size(self) -> int:
+        # the padding up to the next 0x800
+        if self._footer_size == None:
+            self._footer_size = -(self._disk_location + self._compressed_size) % 0x800
+        return self._footer_size
 
-        self.original_size &= 0xf_ff_ff_ff
+    @property
+    def output_name(self) -> str:
+        if self._output_name == None:
+            return f"{self.file} {self.lookback_bit_size:02x}{self.repetition_bit_size:02x} {self._disk_location:08x}.dat"
+        return self._output_name
 
-        self.output_name = f"{self.file} {self.lookback_bit_size:02x}{self.repetition_bit_size:02x} {self.disk_location:08x}.dat"
-        
-        self.reset_output_name()
+    @output_name.setter
+    def output_name(self, value:str):
+        self._output_name = value
 
     def reset_output_name(self):
-        self.output_name = f"{self.file} {self.lookback_bit_size:02x}{self.repetition_bit_size:02x} {self.disk_location:08x}.dat"
+        self._output_name = None
 
     def __str__(self) -> str:
         s = ""
@@ -654,22 +1055,7 @@ class DataEntry(DataBytesInterpreter):
         }
     
     def from_dict(d:dict) -> DataEntry:
-        data = DataEntry(
-            pack(
-                DataEntry.DATA_FORMAT, 
-                d["repetitionBitSize"], 
-                d["lookbackBitSize"], 
-                d["size"] | (d["compressionFlag"] << 28), 
-                d["offset"], 
-                d["compressedSize"]
-            ),
-            0,
-            d["Input"]
-        )
-
-        if "Output" in d:
-            data.output_name = d["Output"]
-        return data
+        return DataEntry(d["Input"], d["lookbackBitSize"], d["repetitionBitSize"], d["size"], d["offset"], d["compressedSize"], d["compressionFlag"], d.get("Output"))
     
     def to_range(self):
         return range(self.disk_location, self.disk_location + self.compressed_size + self.footer_size)
@@ -694,168 +1080,229 @@ class DataEntry(DataBytesInterpreter):
     def __repr__(self) -> str:
         return self.__str__()
 
+class ArchiveReader:
+    """Memory maps a file, parts of it are handed out as memoryviews without copying."""
+    def __init__(self, file_name:str) -> None:
+        self.file_name = file_name
+
+        with open(file_name, "rb") as f:
+            try:
+                self.data = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError: # empty files can't be mapped
+                self.data = b''
+
+        self.view = memoryview(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def find(self, sub:bytes, start:int=0, end:int=None) -> int:
+        return self.data.find(sub, start, len(self.data) if end == None else end)
+
+    def count(self, sub:bytes) -> int:
+        return self.data.count(sub)
+
+    def get_view(self, offset:int, size:int=None) -> memoryview:
+        stop = len(self.data) if size == None else min(len(self.data), offset + size)
+        return self.view[offset:stop]
+
+    def get_entry_view(self, entry:DataEntry) -> memoryview:
+        if entry.compressed_size > 0:
+            size = entry.compressed_size
+        elif entry.lookback_bit_size == 0 and entry.repetition_bit_size == 0:
+            size = entry.original_size
+        else:
+            # unreferenced entries don't know their size, they can't use more than the rolling decompressor reads
+            original_size = entry.original_size if entry.original_size > 0 else RollingDecompressor.MAX_SIZE
+            size = max_compressed_size(original_size, entry.lookback_bit_size, entry.repetition_bit_size)
+
+        return self.get_view(entry.disk_location, size)
+
 class FileCache:
     def __init__(self) -> None:
-        self.__byte_cache__ = {}
+        self.__byte_cache__:dict[str, ArchiveReader] = {}
     
     def __load_file(self, file_name:str):
         assert(file_name not in self.__byte_cache__)
 
-        with open(file_name, "rb") as f:
-            self.__byte_cache__[file_name] = f.read()
+        self.__byte_cache__[file_name] = ArchiveReader(file_name)
 
-    def get_file_bytes(self, file_name:str)->bytes:
+    def get_archive(self, file_name:str) -> ArchiveReader:
         if file_name not in self.__byte_cache__:
             self.__load_file(file_name)
 
         return self.__byte_cache__[file_name]
+
+    def get_file_bytes(self, file_name:str)->bytes:
+        # the memory map supports len, find, indexing and slicing like bytes
+        return self.get_archive(file_name).data
+
+    def get_file_view(self, file_name:str, offset:int=0, size:int=None) -> memoryview:
+        return self.get_archive(file_name).get_view(offset, size)
     
 class MultipleRanges:
+    """Sorted ranges that don't overlap or touch, ranges that do are combined when added."""
     def __init__(self) -> None:
-        self.__ranges:list[range] = []
+        # parallel lists, sorted, and every stop is before the next start
+        self.__starts:list[int] = []
+        self.__stops:list[int] = []
+        self.__arrays = None
 
     def __overlap(r1:range, r2:range):
         return (
             # if one of the start/stops exists in the other
             (r2.start in r1 or r2.stop in r1) or
             (r1.start in r2 or r1.stop in r2))
-    
-    def __overlap_or_touch(r1:range, r2:range):
-        return (
-            # if they overlap on an edge
-            r1.start == r2.stop or 
-            r2.start == r1.stop or
-            MultipleRanges.__overlap(r1, r2))
-    
-    def __combine_range(r1:range, r2:range)->range:
-        if MultipleRanges.__overlap_or_touch(r1, r2):
-            all_points = [r1.start, r2.start, r1.stop, r2.stop]
-            # if the overlap, just take the max and mins
-            return range(min(all_points), max(all_points))
-        return None
+
+    def __touching_indices(self, r:range) -> tuple[int, int]:
+        # the stored ranges that overlap or touch r, stored range i with start <= r.stop and stop >= r.start
+        return bisect_left(self.__stops, r.start), bisect_right(self.__starts, r.stop)
 
     def does_overlap(self, r:range):
-        return any([MultipleRanges.__overlap(x, r) for x in self.__ranges])
+        low, high = self.__touching_indices(r)
+        return any(MultipleRanges.__overlap(range(self.__starts[i], self.__stops[i]), r) for i in range(low, high))
 
     def add_range(self, r:range):
+        low, high = self.__touching_indices(r)
 
-        overlapping_indices = [i for i, this_range in enumerate(self.__ranges) if MultipleRanges.__overlap_or_touch(r, this_range)]
-
-        if len(overlapping_indices) == 0:
-            self.__ranges.append(r)
+        if low == high:
+            self.__starts.insert(low, r.start)
+            self.__stops.insert(low, r.stop)
         else:
-            # indices should be next to eachother
-            new_range = range(r.start, r.stop)
-            for ind in overlapping_indices:
-                new_range = MultipleRanges.__combine_range(new_range, self.__ranges[ind])
-                assert(new_range != None)
-
-            to_remove_ind = min(overlapping_indices)
-            to_remove_count = len(overlapping_indices)
-            for _ in range(to_remove_count):
-                self.__ranges.pop(to_remove_ind)
-            
-            self.__ranges.append(new_range)
+            # if the overlap, just take the max and mins
+            self.__starts[low:high] = [min(r.start, self.__starts[low])]
+            self.__stops[low:high] = [max(r.stop, self.__stops[high - 1])]
+
+        self.__arrays = None
+
+    def add_ranges(self, ranges:list[range]):
+        all_ranges = sorted([(r.start, r.stop) for r in ranges] + list(zip(self.__starts, self.__stops)))
+
+        starts, stops = [], []
+        for start, stop in all_ranges:
+            if len(stops) > 0 and start <= stops[-1]:
+                stops[-1] = max(stops[-1], stop)
+            else:
+                starts.append(start)
+                stops.append(stop)
+
+        self.__starts, self.__stops = starts, stops
+        self.__arrays = None
 
-        self.__ranges.sort(key=lambda x: x.start)
+    def get_ranges(self) -> list[range]:
+        return [range(start, stop) for start, stop in zip(self.__starts, self.__stops)]
 
     def __str__(self) -> str:
-        return f"{self.__ranges}"
+        return f"{self.get_ranges()}"
     
     def __repr__(self) -> str:
         return self.__str__()
 
+    def __len__(self) -> int:
+        return len(self.__starts)
+
     def remove_range(self, r:range):
-        new_ranges = []
-
-        for old_range in self.__ranges:
-            if (old_range.start >= r.start and 
-                old_range.stop <= r.stop): # complete overlap, remove
-                pass
-            elif (old_range.start <= r.start and
-                   old_range.stop >= r.start and 
-                   old_range.stop <= r.stop): # overlap top
-                new_ranges.append(range(old_range.start, r.start))
-            elif (old_range.stop >= r.stop and
-                   old_range.start >= r.start and 
-                   old_range.start <= r.stop): # overlap bottom
-                new_ranges.append(range(r.stop, old_range.stop))
-            elif (r.start >= old_range.start and 
-                  r.stop <= old_range.stop): # overlap middle
-                new_ranges.append(range(old_range.start, r.start))
-                new_ranges.append(range(r.stop, old_range.stop))            
-
-        self.__ranges = new_ranges
-
-        self.__ranges.sort(key=lambda x: x.start)
+        if r.start >= r.stop:
+            return
+
+        starts, stops = [], []
+
+        for start, stop in zip(self.__starts, self.__stops):
+            # keep what is outside of r
+            if start < r.start:
+                starts.append(start)
+                stops.append(min(stop, r.start))
+            if stop > r.stop:
+                starts.append(max(start, r.stop))
+                stops.append(stop)
+
+        self.__starts, self.__stops = starts, stops
+        self.__arrays = None
     
     def __contains__(self, value):
-        if len(self.__ranges) == 0:
-            return False 
-        # binary search
-        max_ind = len(self.__ranges)
-        min_ind = 0
-        ind = max_ind // 2
-        while True:
-            this_range = self.__ranges[ind]
-            
-            if value in this_range:
-                return True
-            
-            if ind == min_ind or ind == len(self.__ranges) - 1:
-                return False
-            
-            if value < this_range.start:
-                max_ind = ind
-                ind = (ind + min_ind) // 2
-            elif value > this_range.stop:
-                min_ind = ind
-                ind = (ind + max_ind) // 2
-            elif value == this_range.stop:
-                return False
+        ind = bisect_right(self.__starts, value) - 1
+        return ind >= 0 and value < self.__stops[ind]
+
+    def contains_many(self, values) -> np.ndarray:
+        """value in self for every value, as a bool array."""
+        if self.__arrays == None:
+            self.__arrays = (np.array(self.__starts, dtype=np.int64), np.array(self.__stops, dtype=np.int64))
+        starts, stops = self.__arrays
+
+        values = np.asarray(values, dtype=np.int64)
+        if len(starts) == 0:
+            return np.zeros(values.shape, dtype=bool)
+
+        ind = np.searchsorted(starts, values, side='right') - 1
+        return (ind >= 0) & (values < stops[np.maximum(ind, 0)])
             
 class FingerPrintSearcher:
     def __init__(self, b:bytearray, file_name:str) -> None:
         self.data = b
         self.file_name = file_name
+        self.__array = np.frombuffer(b, dtype=np.uint8)
+        # big endian ints starting at every alignment, so a record at any position can be read without a copy
+        self.__ints = [self.__array[i:i + (len(self.__array) - i) // 4 * 4].view('>u4') for i in range(4)]
+
+    def __read_ints(self, positions:np.ndarray) -> np.ndarray:
+        values = np.zeros(len(positions), dtype=np.int64)
+        for alignment, ints in enumerate(self.__ints):
+            at_alignment = positions % 4 == alignment
+            values[at_alignment] = ints[positions[at_alignment] // 4]
+        return values
+
+    def __read_entry_fields(self, positions:np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The original size (with the compression flag), disk location and compressed size of the DataEntry records at positions."""
+        return self.__read_ints(positions + 4), self.__read_ints(positions + 8), self.__read_ints(positions + 12)
+
+    def __to_entries(self, positions:np.ndarray) -> set[DataEntry]:
+        return set(DataEntry.from_bytes_many(self.__array, positions, self.file_name))
+
+    def find_all(self, to_find:bytes, overlapping:bool=False) -> np.ndarray:
+        """Every position of to_find that has a whole DataEntry record after it."""
+        positions = []
+        step = 1 if overlapping else len(to_find)
+        last_record = len(self.data) - DataEntry.SIZE_OF_STRUCT
+
+        ind = self.data.find(to_find)
+        while 0 <= ind <= last_record:
+            positions.append(ind)
+            ind = self.data.find(to_find, ind + step)
+        return np.array(positions, dtype=np.int64)
 
     def search_compression(self, lookback:int, repetitions:int) -> set[DataEntry]:
         to_find = ((repetitions << 8) | lookback).to_bytes(4, 'big')
-        d = self.data
-        
-        found = set()
-
-        ind = d.find(to_find)
-        while ind > 0 and len(d) >= DataEntry.SIZE_OF_STRUCT:
-            entry = DataEntry(d, ind, self.file_name)            
-            # for now it has to be a mult of 2048 bytes, and not 0
-            if entry.disk_location % 0x800 == 0 and entry.disk_location != 0:
-                found.add(entry)
-            
-            d = d[ind + len(to_find):]
-            ind = d.find(to_find)
-        
-        return found
+        positions = self.find_all(to_find)
+
+        _, disk_location, _ = self.__read_entry_fields(positions)
+
+        # for now it has to be a mult of 2048 bytes, and not 0
+        return self.__to_entries(positions[(disk_location % 0x800 == 0) & (disk_location != 0)])
 
     def search_uncompressed(self) -> set[DataEntry]:
         epsilon = 3
-        to_find = (0).to_bytes(4, 'big')
-        d = self.data
-        found = set()
+        data = self.__array
+        last_record = len(data) - DataEntry.SIZE_OF_STRUCT
+        if last_record < 0:
+            return set()
 
-        ind = d.find(to_find)
-        while ind >= 0 and len(d[ind:]) >= DataEntry.SIZE_OF_STRUCT:
-            entry = DataEntry(d, ind, self.file_name)
-            
-            # for now it has to be a mult of 2048 bytes, and not 0
-            if entry.disk_location % 0x800 == 0 and entry.disk_location != 0:
-                # compressed size and entry size should be close to same size, but not 0
-                if entry.compressed_size > 0 and entry.original_size > 0 and abs(entry.compressed_size - entry.original_size) <= epsilon:
-                    found.add(entry)
-            
-            d = d[ind + 1:]
-            ind = d.find(to_find)
-        return found
+        # every position that starts 4 zero bytes, there are too many of them to find one at a time
+        is_zero = data[:last_record + 4] == 0
+        starts_zeros = is_zero[:-3] & is_zero[1:-2] & is_zero[2:-1] & is_zero[3:]
+        positions = np.flatnonzero(starts_zeros)
+
+        original_size, disk_location, compressed_size = self.__read_entry_fields(positions)
+        original_size &= 0xf_ff_ff_ff
+
+        # for now it has to be a mult of 2048 bytes, and not 0
+        keep = (disk_location % 0x800 == 0) & (disk_location != 0)
+        # compressed size and entry size should be close to same size, but not 0
+        keep &= (compressed_size > 0) & (original_size > 0) & (np.abs(compressed_size - original_size) <= epsilon)
+
+        return self.__to_entries(positions[keep])
 
 def get_parts_of_file(file_bytes:bytearray):
     found_inds = []
@@ -1,6 +1,12 @@
 from dataclasses import dataclass
 import typing
 from helper_vector import *
+from helper_mssb_data import ensure_dir
+from os.path import dirname
+from io import BytesIO
+import numpy as np
+
+OBJ_WRITE_BUFFER_SIZE = 1 << 20
 
 class PositionVector(Vector3):
     def __str__(self) -> str:
@@ -14,6 +20,26 @@ class NormalVector(Vector3):
     def __str__(self) -> str:
         return f"vn {self.X} {-self.Y} {-self.Z}" 
     
+# obj line prefix and the sign of every component, y and z point the other way in an obj
+VECTOR_FORMATS = {
+    PositionVector: ("v",  [1, -1, -1]),
+    TextureVector:  ("vt", [1, -1]),
+    NormalVector:   ("vn", [1, -1, -1]),
+}
+
+def vector_text(vectors, cls, precision:int=None) -> str:
+    """The obj lines of (N, k) arrays from parse_array_values or lists of vectors, floats get precision decimals if it is given."""
+    prefix, signs = VECTOR_FORMATS[cls]
+    if len(vectors) == 0:
+        return ""
+    if not isinstance(vectors, np.ndarray):
+        vectors = [[x[i] for i in range(len(signs))] for x in vectors]
+    values = np.asarray(vectors, dtype=np.float64)[:, :len(signs)] * signs
+
+    number = "{}" if precision == None else f"{{:.{precision}f}}"
+    line = prefix + f" {number}" * len(signs)
+    return "\n".join([line.format(*x) for x in values.tolist()]) + "\n"
+
 @dataclass
 class OBJIndex:
     ind: 'typing.Any'=None
@@ -38,18 +64,51 @@ class OBJFace:
     def __str__(self) -> str:
         return "f " + " ".join(str(x) for x in self.obj_indices)
 
+@dataclass
+class OBJFaces:
+    """Triangles as (faces, 3) arrays of indices for each attribute, None for an attribute the vertices don't have."""
+    count:int
+    positions:np.ndarray = None
+    textures:np.ndarray = None
+    normals:np.ndarray = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def text(self) -> str:
+        # same text as OBJFace, a missing index is left empty
+        present = [x for x in [self.positions, self.textures, self.normals] if x is not None]
+        if self.count == 0:
+            return ""
+        if len(present) == 0:
+            return "f // // //\n" * self.count
+
+        corner = "/".join("{}" if x is not None else "" for x in [self.positions, self.textures, self.normals])
+        line = "f " + " ".join([corner] * 3)
+        # the indices in the order they are written, corner by corner
+        columns = np.stack([x[:, i] for i in range(3) for x in present], axis=1) + 1
+        return "\n".join([line.format(*x) for x in columns.tolist()]) + "\n"
+
+def face_text(faces) -> str:
+    # OBJFaces from parse_indices or lists of OBJFace
+    if isinstance(faces, OBJFaces):
+        return faces.text()
+    return "".join(f"{x}\n" for x in faces)
+
 @dataclass
 class OBJGroup:
+    # lists of vectors or (N, k) arrays
     positions: list[PositionVector]
     textures: list[TextureVector]
     normals: list[NormalVector]
 
-    faces: list[OBJFace]
+    faces: list[OBJFace] # or OBJFaces
     comments:list[str]
 
     mtl:"typing.any" = None
     name:"typing.any" = None
-    def __str__(self) -> str:
+
+    def write(self, f:typing.BinaryIO, precision:int=None):
         t = ""
 
         if self.name != None:
@@ -62,56 +121,58 @@ class OBJGroup:
             for c in self.comments:
                 t += f"# {c}\n"
 
-        for p in self.positions:
-            t += f"{p}\n"
-        for p in self.normals:
-            t += f"{p}\n"
-        for p in self.textures:
-            t += f"{p}\n"
-        for p in self.faces:
-            t += f"{p}\n"
+        f.write(t.encode())
+        # a block at a time, so only one block is ever held as text
+        f.write(vector_text(self.positions, PositionVector, precision).encode())
+        f.write(vector_text(self.normals, NormalVector, precision).encode())
+        f.write(vector_text(self.textures, TextureVector, precision).encode())
+        f.write(face_text(self.faces).encode())
 
-        return t
+    def __str__(self) -> str:
+        f = BytesIO()
+        self.write(f)
+        return f.getvalue().decode()
 
 @dataclass        
 class OBJFile:
     groups:list[OBJGroup]
     mtl_file:str = None
 
-    def __str__(self) -> str:
-        t = ""
-
+    def write(self, f:typing.BinaryIO, precision:int=None):
         if self.mtl_file != None:
-            mtl = self.mtl_file.replace("\\", "\\\\")
-            t+= f"mtllib {self.mtl_file}\n"
-        
-        for mtl in self.groups:
-            t += f"{mtl}\n"
+            f.write(f"mtllib {self.mtl_file}\n".encode())
         
-        return t
+        for group in self.groups:
+            group.write(f, precision)
+            f.write(b"\n")
+
+    def save(self, file_path:str, precision:int=None):
+        """Streams the obj file to file_path, floats get precision decimals if it is given."""
+        ensure_dir(dirname(file_path))
+        with open(file_path, "wb", buffering=OBJ_WRITE_BUFFER_SIZE) as f:
+            self.write(f, precision)
+
+    def __str__(self) -> str:
+        f = BytesIO()
+        self.write(f)
+        return f.getvalue().decode()
     
     def assert_valid(self):
-        poss = []
-        uvs = []
-        norms = []
+        # every index has to point at a vector written before its face
+        counts = {"positions": 0, "textures": 0, "normals": 0}
         for g in self.groups:
-            if g.positions != None:
-                poss.extend(g.positions)
-            if g.normals != None:
-                norms.extend(g.positions)
-            if g.textures != None:
-                uvs.extend(g.positions)
-        
-            for f in g.faces:
-                for o in f.obj_indices:
-
-                    if o.position_coordinate.ind != None and o.position_coordinate.ind >= len(poss):
-                        return False
-                                            
-                    if o.normal_coordinate.ind != None and o.normal_coordinate.ind >= len(norms):
-                        return False
-
-                    if o.texture_coordinate.ind != None and o.texture_coordinate.ind >= len(uvs):
-                        return False
+            for name in counts:
+                vectors = getattr(g, name)
+                if vectors is not None:
+                    counts[name] += len(vectors)
+
+            for name, field in [("positions", "position_coordinate"), ("textures", "texture_coordinate"), ("normals", "normal_coordinate")]:
+                if isinstance(g.faces, OBJFaces):
+                    indices = getattr(g.faces, name)
+                    indices = [] if indices is None else indices.reshape(-1).tolist()
+                else:
+                    indices = [getattr(o, field).ind for f in g.faces for o in f.obj_indices if getattr(o, field) != None]
+
+                if any(x != None and x >= counts[name] for x in indices):
+                    return False
         return True
-    
\ No newline at end of file
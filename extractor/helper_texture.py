@@ -1,6 +1,8 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from PIL.Image import Image, new as new_Image
+from PIL.Image import Image, new as new_Image, frombuffer
+from functools import lru_cache
+import numpy as np
 from os.path import join
 from helper_mssb_data import *
 
@@ -97,7 +99,7 @@ class TPLTextureHeader(DataBytesInterpreter):
         this_width, \
         this_format, \
         this_palette_format, \
-        = TPLTextureHeader.parse_bytes_static(b, offset, TPLTextureHeader.DATA_FORMAT)
+        = TPLTextureHeader.parse_bytes_static(b, offset)
 
         return TPLTextureHeader(
             address=this_address,
@@ -108,6 +110,11 @@ class TPLTextureHeader(DataBytesInterpreter):
             palette_format=this_palette_format
         )
 
+    def from_bytes_many(b:bytes, offset:int, count:int) -> list[TPLTextureHeader]:
+        """count headers one after another from offset."""
+        return [TPLTextureHeader(address=address, palette=palette, height=height, width=width, format=format, palette_format=palette_format)
+                for address, palette, height, width, format, palette_format in TPLTextureHeader.unpack_many(b, offset, count)]
+
 class TPLColor:
     @classmethod
     def from_bytes(cls, b:bytes):
@@ -127,10 +134,11 @@ class TPLColorIA8(TPLColor):
 
     @classmethod
     def from_int(cls, i: int):
-        a = i & 0xFF
-        i = i >> 8
-        # return i | (i << 8) | (i << 16) | (a << 24);
-        
+        # alpha is the first byte and intensity the second, texels and palette entries alike.
+        # the ints are read big endian here, so alpha is the high byte
+        a = i >> 8
+        i = i & 0xFF
+
         cls.data = (i, i, i, a)
         
         return cls
@@ -170,9 +178,69 @@ class TPLColorRGB5A3(TPLColor):
             return cls.data[0] << 4 | cls.data[1] | cls.data[2] >> 4 | cls.data[3] << 7
 
 
+@lru_cache(maxsize=None)
+def get_color_table(color:type[TPLColor]) -> np.ndarray:
+    """Every 16-bit value decoded with a TPLColor class, so whole images can be converted with one lookup."""
+    return np.array([color.from_int(x).data for x in range(0x10000)], dtype=np.uint8)
+
+def read_palette(source:bytes, header:TPLTextureHeader, color_count:int) -> np.ndarray:
+    byt = bytes(source[header.palette:][:color_count * 2])
+
+    # colors past the end of the data read as zero, a lone last byte is read on its own
+    palette = np.zeros(color_count, dtype=np.int64)
+    full_colors = len(byt) // 2
+    palette[:full_colors] = np.frombuffer(byt[:full_colors * 2], dtype='>u2')
+    if len(byt) % 2:
+        palette[full_colors] = byt[-1]
+    return palette
+
+def read_image_data(source:bytes, header:TPLTextureHeader, size:int) -> np.ndarray:
+    image_data = source[header.address:][:size]
+    if len(image_data) < size:
+        raise IndexError(f"Texture data is {len(image_data)} bytes, needed {size}")
+    return np.frombuffer(bytes(image_data), dtype=np.uint8)
+
+def get_pixel_coordinates(width:int, height:int) -> tuple[np.ndarray, np.ndarray]:
+    t, s = np.indices((height, width), dtype=np.int64)
+    return s, t
+
+def image_from_pixels(pixels:np.ndarray, pixel_format:str) -> Image.Image:
+    height, width = pixels.shape[:2]
+    return frombuffer(pixel_format, (width, height), np.ascontiguousarray(pixels, dtype=np.uint8).tobytes(), "raw", pixel_format, 0, 1)
+
+def get_tiled_size(width:int, height:int, block_width:int, block_height:int, block_size:int=32) -> int:
+    blocks_wide = -(-width // block_width)
+    blocks_high = -(-height // block_height)
+    return blocks_wide * blocks_high * block_size
+
+def detile(texels:np.ndarray, width:int, height:int, block_width:int, block_height:int) -> np.ndarray:
+    """Puts texels stored block after block (each block row by row) in image order, (height, width, ...)."""
+    blocks_wide = -(-width // block_width)
+    blocks_high = -(-height // block_height)
+
+    texels = texels[:blocks_wide * blocks_high * block_width * block_height]
+    texels = texels.reshape((blocks_high, blocks_wide, block_height, block_width) + texels.shape[1:])
+    texels = texels.swapaxes(1, 2)
+    return texels.reshape((blocks_high * block_height, blocks_wide * block_width) + texels.shape[4:])[:height, :width]
+
+def split_nibbles(image_data:np.ndarray) -> np.ndarray:
+    # the high nibble is the first texel
+    return np.stack((image_data >> 4, image_data & 0xF), axis=-1).reshape(-1)
+
+def get_palette_color(header:TPLTextureHeader) -> tuple[type[TPLColor], str]:
+    if header.palette_format == REV_VALID_IMAGE_FORMATS['IA8']:
+        return TPLColorIA8, "RGBA"
+    elif header.palette_format == REV_VALID_IMAGE_FORMATS['RGB565']:
+        return TPLColorR5G6B5, "RGB"
+    elif header.palette_format == REV_VALID_IMAGE_FORMATS['RGB5A3']:
+        return TPLColorRGB5A3, "RGBA"
+    else:
+        assert(False)
+
 class TPLFileC4:
     @staticmethod
-    def get_pixel(src:bytes, s:int, t:int, width:int, palette):
+    def get_pixel_values(src:bytes, width:int, height:int) -> np.ndarray:
+        s, t = get_pixel_coordinates(width, height)
         sBlk = s >> 3
         tBlk = t >> 3
         widthBlks = (width >> 3)
@@ -181,45 +249,27 @@ class TPLFileC4:
         blkT = t & 7
         blkOff = (blkT << 3) + blkS
 
-        rs = 0 if (blkOff & 1) else 4
+        rs = np.where(blkOff & 1, 0, 4)
         offset = base + (blkOff >> 1)
 
-        val = ((src[offset]) >> rs) & 0xF
-        # print(val)
-        # val = (val << 4) & val
-        return palette[val]
+        if offset.max() >= len(src):
+            raise IndexError(f"C4 texture needs {offset.max() + 1} bytes, received {len(src)}")
+
+        return (src[offset] >> rs) & 0xF
     
     @staticmethod
     def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
         width, height = (header.width, header.height)
         blocks_to_read = (width//4) * (height//4) * 8
-        image_data = source[header.address:][:blocks_to_read]
+        image_data = np.frombuffer(bytes(source[header.address:][:blocks_to_read]), dtype=np.uint8)
 
-        byt = source[header.palette:][:0x20]
-        palette = [int.from_bytes(byt[i*2:i*2+2], 'big') for i in range(0x10)]
-
-        if header.palette_format == REV_VALID_IMAGE_FORMATS['IA8']:
-            func = TPLColorIA8
-            pixel_format = "RGBA"
-        elif header.palette_format == REV_VALID_IMAGE_FORMATS['RGB565']:
-            func = TPLColorR5G6B5
-            pixel_format = "RGB"
-        elif header.palette_format == REV_VALID_IMAGE_FORMATS['RGB5A3']:
-            func = TPLColorRGB5A3
-            pixel_format = "RGBA"
-        else:
-            assert(False)
+        palette = read_palette(source, header, 0x10)
 
-        palette = [func.from_int(x).data for x in palette]
+        func, pixel_format = get_palette_color(header)
 
-        image = new_Image(pixel_format, (width, height))
+        palette = get_color_table(func)[palette]
 
-        for t in range(height):
-            for s in range(width):
-                p = TPLFileC4.get_pixel(image_data, s, t, width, palette)
-                image.putpixel((s,t), p)
-        
-        return image
+        return image_from_pixels(palette[TPLFileC4.get_pixel_values(image_data, width, height)], pixel_format)
 
 
 class TPLFileCMPR:
@@ -227,23 +277,57 @@ class TPLFileCMPR:
     def dxt_blend(v1, v2):
         return ((v1 * 3 + v2 * 5) >> 3)
 
+    @staticmethod
+    def get_block_colors(blocks:np.ndarray) -> np.ndarray:
+        """The 4 colors each dxt block can choose from, (block count, 4, RGBA)."""
+        def to_rgb(c):
+            return np.stack(((c >> 11) << 3, ((c >> 5) & 0b111111) << 2, (c & 0b11111) << 3), axis=-1)
+
+        c1_int = (blocks[:, 0].astype(np.int32) << 8) | blocks[:, 1]
+        c2_int = (blocks[:, 2].astype(np.int32) << 8) | blocks[:, 3]
+        c1 = to_rgb(c1_int)
+        c2 = to_rgb(c2_int)
+        # comparing the decoded colors is the same as comparing the ints
+        c1_greater = (c1_int > c2_int)[:, None]
+        average = (c1 + c2) // 2
+
+        colors = np.full((len(blocks), 4, 4), 255, dtype=np.int32)
+        colors[:, 0, :3] = c1
+        colors[:, 1, :3] = c2
+        colors[:, 2, :3] = np.where(c1_greater, TPLFileCMPR.dxt_blend(c2, c1), average)
+        colors[:, 3, :3] = np.where(c1_greater, TPLFileCMPR.dxt_blend(c1, c2), average)
+        colors[:, 3, 3] = np.where(c1_greater[:, 0], 255, 0)
+        return colors
+
     @staticmethod
     def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
         width, height = (header.width, header.height)
         blocks_to_read = (width//4) * (height//4) * 8
 
         image_data = source[header.address:][:blocks_to_read]
-        image = new_Image("RGBA", (width, height))
 
-        for t in range(height):
-            for s in range(width):
-                p = TPLFileCMPR.get_pixel(image_data, s, t, width)
-                image.putpixel((s,t), p)
-        return image
+        s, t = get_pixel_coordinates(width, height)
+        block_index = TPLFileCMPR.get_block_index(s, t, width)
+
+        block_count = int(block_index.max()) + 1
+        if block_count * 8 > len(image_data):
+            raise IndexError(f"CMPR texture needs {block_count * 8} bytes, received {len(image_data)}")
+
+        blocks = np.frombuffer(bytes(image_data[:block_count * 8]), dtype=np.uint8).reshape(block_count, 8)
+        colors = TPLFileCMPR.get_block_colors(blocks)
+
+        ss = s & 3
+        tt = t & 3
+
+        color_select = blocks[block_index, 4 + tt]
+        rs = 6 - (ss << 1)
+
+        color_select = (color_select >> rs) & 3
 
+        return image_from_pixels(colors[block_index, color_select], "RGBA")
 
     @staticmethod
-    def get_pixel(src:bytes, s:int, t:int, width:int):
+    def get_block_index(s:np.ndarray, t:np.ndarray, width:int) -> np.ndarray:
         sDxt = s >> 2
         tDxt = t >> 2
         
@@ -255,41 +339,12 @@ class TPLFileCMPR:
         blockT = tDxt & 1
         block_offset = (blockT << 1) + blockS
         
-        offset = (base + block_offset) << 3
-
-        dxt_block = src[offset:offset+8]
-
-        c1 = TPLColorR5G6B5().from_bytes(dxt_block[0:2]).data
-        c2 = TPLColorR5G6B5().from_bytes(dxt_block[2:4]).data
-
-        ss = s & 3
-        tt = t & 3
-
-        color_select = dxt_block[4:][tt]
-        rs = 6 - (ss << 1)
-
-        color_select = (color_select >> rs) & 3
-
-        color_select |= 0 if c1 > c2 else 4
-
-        if color_select in [0,4]:
-            return (c1[0], c1[1], c1[2], 255)
-        elif color_select in [1,5]:
-            return (c2[0], c2[1], c2[2], 255)
-        elif color_select in [2]:
-            return (TPLFileCMPR.dxt_blend(c2[0], c1[0]), TPLFileCMPR.dxt_blend(c2[1], c1[1]), TPLFileCMPR.dxt_blend(c2[2], c1[2]), 255)
-        elif color_select in [3]:
-            return (TPLFileCMPR.dxt_blend(c1[0], c2[0]), TPLFileCMPR.dxt_blend(c1[1], c2[1]), TPLFileCMPR.dxt_blend(c1[2], c2[2]), 255)
-        elif color_select in [6]:
-            return ((c1[0] + c2[0]) // 2, (c1[1] + c2[1]) // 2, (c1[2] + c2[2]) // 2, 255)
-        elif color_select in [7]:
-            return ((c1[0] + c2[0]) // 2, (c1[1] + c2[1]) // 2, (c1[2] + c2[2]) // 2, 0)
-        else:
-            return (0,0,0,0)
+        return base + block_offset
 
 class TPLFileC8:
     @staticmethod
-    def get_pixel(src:bytes, s:int, t:int, width:int, palette):
+    def get_pixel_offsets(width:int, height:int) -> np.ndarray:
+        s, t = get_pixel_coordinates(width, height)
         sBlk = s >> 3
         tBlk = t >> 2
         widthBlks = (width >> 3)
@@ -298,18 +353,15 @@ class TPLFileC8:
         blkT = t & 3
         blkOff = (blkT << 3) + blkS
 
-        val = src[base+blkOff]
-
-        return palette[val]
+        return base + blkOff
     
     @staticmethod
     def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
         width, height = (header.width, header.height)
-        # blocks_to_read = (width//4) * (height//4) * 8
-        image_data = source[header.address:]
+        offsets = TPLFileC8.get_pixel_offsets(width, height)
+        image_data = read_image_data(source, header, int(offsets.max()) + 1)
 
-        byt = source[header.palette:][:0x200]
-        palette = [int.from_bytes(byt[i*2:i*2+2], 'big') for i in range(0x100)]
+        palette = read_palette(source, header, 0x100)
 
         # if header.palette_format == 0: # RGB565
         #     func = TPLColorR5G6B5
@@ -323,13 +375,92 @@ class TPLFileC8:
         # else:
         #     assert(False)
 
-        palette = [func.from_int(x).data for x in palette]
+        palette = get_color_table(func)[palette]
 
-        image = new_Image(pixel_format, (width, height))
+        return image_from_pixels(palette[image_data[offsets]], pixel_format)
 
-        for t in range(height):
-            for s in range(width):
-                p = TPLFileC8.get_pixel(image_data, s, t, width, palette)
-                image.putpixel((s,t), p)
-        
-        return image
+class TPLFileI4:
+    @staticmethod
+    def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
+        width, height = (header.width, header.height)
+        image_data = read_image_data(source, header, get_tiled_size(width, height, 8, 8))
+
+        i = detile(split_nibbles(image_data), width, height, 8, 8) << 4
+
+        return image_from_pixels(np.stack((i, i, i, i), axis=-1), "RGBA")
+
+class TPLFileI8:
+    @staticmethod
+    def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
+        width, height = (header.width, header.height)
+        image_data = read_image_data(source, header, get_tiled_size(width, height, 8, 4))
+
+        i = detile(image_data, width, height, 8, 4)
+
+        return image_from_pixels(np.stack((i, i, i, i), axis=-1), "RGBA")
+
+class TPLFileIA4:
+    @staticmethod
+    def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
+        width, height = (header.width, header.height)
+        image_data = read_image_data(source, header, get_tiled_size(width, height, 8, 4))
+
+        texels = detile(image_data, width, height, 8, 4)
+        i = (texels & 0xF) << 4
+        a = (texels >> 4) << 4
+
+        return image_from_pixels(np.stack((i, i, i, a), axis=-1), "RGBA")
+
+class TPLFile16Bit:
+    """Textures with a 16-bit color per texel in 4x4 blocks, the color is decoded with COLOR."""
+    COLOR:type[TPLColor] = None
+    PIXEL_FORMAT = "RGBA"
+
+    @classmethod
+    def parse_source(cls, source:bytes, header: TPLTextureHeader) -> Image.Image:
+        width, height = (header.width, header.height)
+        image_data = read_image_data(source, header, get_tiled_size(width, height, 4, 4))
+
+        texels = detile(image_data.view('>u2'), width, height, 4, 4)
+
+        return image_from_pixels(get_color_table(cls.COLOR)[texels], cls.PIXEL_FORMAT)
+
+class TPLFileIA8(TPLFile16Bit):
+    COLOR = TPLColorIA8
+
+class TPLFileRGB565(TPLFile16Bit):
+    COLOR = TPLColorR5G6B5
+    PIXEL_FORMAT = "RGB"
+
+class TPLFileRGB5A3(TPLFile16Bit):
+    COLOR = TPLColorRGB5A3
+
+class TPLFileRGBA32:
+    @staticmethod
+    def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
+        width, height = (header.width, header.height)
+        image_data = read_image_data(source, header, get_tiled_size(width, height, 4, 4, 64))
+
+        # each block has 16 AR pairs followed by 16 GB pairs
+        blocks = image_data.reshape(-1, 2, 16, 2)
+        ar = blocks[:, 0].reshape(-1, 2)
+        gb = blocks[:, 1].reshape(-1, 2)
+        texels = np.stack((ar[:, 1], gb[:, 0], gb[:, 1], ar[:, 0]), axis=-1)
+
+        return image_from_pixels(detile(texels, width, height, 4, 4), "RGBA")
+
+class TPLFileC14X2:
+    @staticmethod
+    def parse_source(source:bytes, header: TPLTextureHeader) -> Image.Image:
+        width, height = (header.width, header.height)
+        image_data = read_image_data(source, header, get_tiled_size(width, height, 4, 4))
+
+        indices = detile(image_data.view('>u2'), width, height, 4, 4) & 0x3FFF
+
+        palette = read_palette(source, header, int(indices.max()) + 1)
+
+        func, pixel_format = get_palette_color(header)
+
+        palette = get_color_table(func)[palette]
+
+        return image_from_pixels(palette[indices], pixel_format)
@@ -1,14 +1,23 @@
-from helper_mssb_data import DataEntry, RollingDecompressor, ensure_dir, write_bytes, ArchiveDecompressor, get_parts_of_file, write_text
+from helper_mssb_data import DataEntry, RollingDecompressor, ensure_dir, write_bytes, ArchiveReader, get_parts_of_file, write_text
 from os.path import join, exists
 from os import rename
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from argparse import ArgumentParser
+from traceback import format_exc
+from typing import Union
 from run_extract_Texture import export_images
-from run_extract_Model import export_model
+from run_extract_Model import export_model, export_model_glb
 from run_file_discovery import discover_US_files, discover_beta_files, discover_JP_files, discover_EU_files
 import json, progressbar
 from run_draw_pic import draw_pic
 from helper_file_system import *
+from helper_decompression_cache import DecompressionCache
+from helper_catalog import Catalog, catalog_path, catalog_is_current, load_results
 
-def interpret_bytes(b:bytearray, output_folder:str):
+# what the models are written as, obj files next to an mtl and the textures or one glb with the textures inside
+OUTPUT_FORMATS = ['obj', 'glb']
+
+def interpret_bytes(b:bytearray, output_folder:str, output_format:str='obj', precision:int=None):
     parts_of_file = get_parts_of_file(b)
     output_text = f"{len(parts_of_file)} {'part' if len(parts_of_file) == 1 else 'parts'} of file.\n"
 
@@ -19,6 +28,7 @@ def interpret_bytes(b:bytearray, output_folder:str):
         parts_of_file = []
     for part in [-1] + [x for x in range(len(parts_of_file))]:
         new_out_folder = join(output_folder, f"part {part}")
+        base_images = None
         try:
             base_images = export_images(b, part)
             if len(base_images.images) > 0:
@@ -26,12 +36,16 @@ def interpret_bytes(b:bytearray, output_folder:str):
                 any_outputs = True
 
                 base_images.write_images_to_folder(new_out_folder)
-                base_images.write_mtl_file(join(new_out_folder, 'mtl.mtl'), "")
+                if output_format == 'obj':
+                    base_images.write_mtl_file(join(new_out_folder, 'mtl.mtl'), "")
         except:
             pass
 
         try:
-            export_model(b, new_out_folder, part)
+            if output_format == 'glb':
+                export_model_glb(b, join(new_out_folder, "model.glb"), part, base_images)
+            else:
+                export_model(b, new_out_folder, part, precision=precision)
             output_text += f"Part {part} interpreted as model.\n"
             any_outputs = True
         except Exception as e:
@@ -42,188 +56,193 @@ def interpret_bytes(b:bytearray, output_folder:str):
     else:
         write_text(output_text + "No output types found.\n", join(output_folder, "notes.txt"))
 
-def interpret_US():
-    print('Looking at US files...')
-    return interpret_version(US_OUTPUT_FOLDER, US_RESULTS_FILE, US_ZZZZ_FILE, discover_US_files, US_CUSTOM_FILENAMES)
-def interpret_JP():
-    print('Looking at JP files...')
-    return interpret_version(JP_OUTPUT_FOLDER, JP_RESULTS_FILE, JP_ZZZZ_FILE, discover_JP_files, JP_CUSTOM_FILENAMES)
-def interpret_EU():
-    print('Looking at EU files...')
-    return interpret_version(EU_OUTPUT_FOLDER, EU_RESULTS_FILE, EU_ZZZZ_FILE, discover_EU_files, EU_CUSTOM_FILENAMES)
-def interpret_BETA():
-    print('Looking at Beta files...')
-    return interpret_version(BETA_OUTPUT_FOLDER, BETA_RESULTS_FILE, BETA_ZZZZ_FILE, discover_beta_files, BETA_CUSTOM_FILENAMES)
-
-def main():
-    interpret_US()
-    interpret_JP()
-    interpret_EU()
-    interpret_BETA()
+# (results.json key, output folder, message)
+EXTRACTION_PASSES = [
+    ('GameReferencedCompressedFiles', 'Referenced files',   "Interpreting referenced compressed files... (should take about 10 minutes)"),
+    ('UnreferencedCompressedFiles',   'Unreferenced files', "Interpreting unreferenced compressed files... (this will take 30-45 minutes)"),
+    ('AdGCForms',                     'AdGCForms',          "Interpreting AdGCForms files..."),
+    ('GameReferencedRawFiles',        'Raw files',          "Interpreting referenced raw files..."),
+]
+
+# the ZZZZ.dat being extracted, memory mapped once per process so workers share the pages
+ZZZZ_DAT:ArchiveReader = None
+DECOMPRESSION_CACHE:DecompressionCache = None
+OUTPUT_FORMAT = 'obj'
+# decimals of the floats in obj files, None for all of them
+PRECISION:int = None
+
+def open_archive(zzzz_file:str, output_format:str='obj', precision:int=None):
+    global ZZZZ_DAT, DECOMPRESSION_CACHE, OUTPUT_FORMAT, PRECISION
+    ZZZZ_DAT = ArchiveReader(zzzz_file)
+    DECOMPRESSION_CACHE = DecompressionCache(DECOMPRESSION_CACHE_FOLDER, DECOMPRESSION_CACHE_SIZE)
+    OUTPUT_FORMAT = output_format
+    PRECISION = precision
+
+def extract_referenced_compressed(entry:DataEntry, this_folder:str, output_file_name:str):
+    this_data = ZZZZ_DAT.get_entry_view(entry)
+    if len(this_data) == entry.compressed_size:
+        decompressed_bytes = DECOMPRESSION_CACHE.decompress(this_data, entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size)
+
+        interpret_bytes(decompressed_bytes, this_folder, OUTPUT_FORMAT, PRECISION)
+
+        write_bytes(decompressed_bytes, output_file_name)
+
+def extract_unreferenced_compressed(entry:DataEntry, this_folder:str, output_file_name:str):
+    mean = lambda x : sum(x) // len(x) 
 
-def interpret_version(output_folder:str, results_path:str, zzzz_file:str, discovery_method, file_name_path:str):
-    REFERENCED_FOLDER = join(output_folder, 'Referenced files')
-    UNREFERENCED_FOLDER = join(output_folder, 'Unreferenced files')
-    RAW_FOLDER = join(output_folder, 'Raw files')
-    ADGCFORMS_FOLDER = join(output_folder, 'AdGCForms')
+    decompressor = RollingDecompressor(ZZZZ_DAT.get_entry_view(entry), entry.lookback_bit_size, entry.repetition_bit_size)
+    parts_of_file = get_parts_of_file(decompressor)
+    
+    if len(parts_of_file) > 1:
+        if len(parts_of_file) > 0 and parts_of_file[0] == 80_92_000: # base address is a c3 file
+            parts_of_file = []
+        else:
+            # calculate the average size of a section, and decompress that much past the last part start
+            # hopefully should allow for faster decompressing
+            average_size = mean([parts_of_file[x+1] - parts_of_file[x] for x in range(len(parts_of_file) - 1)])
+            try:
+                decompressed_bytes = decompressor[0:parts_of_file[-1] + average_size]
+            except:
+                decompressed_bytes = decompressor
+    else:
+        decompressed_bytes = decompressor
 
-    if not exists(zzzz_file):
-        return
+    interpret_bytes(decompressed_bytes, this_folder, OUTPUT_FORMAT, PRECISION)
 
-    ensure_dir(output_folder)
+    write_bytes(decompressor.outputdata, output_file_name)
 
-    with open(zzzz_file, 'rb') as f:
-        ZZZZ_DAT = f.read()
- 
-    if exists(results_path): 
-        with open(results_path, 'r') as f:
-            found_files = json.load(f)
+def extract_adgcform(entry:DataEntry, this_folder:str, output_file_name:str):
+    if entry.compression_flag == 0:
+        these_bytes = bytes(ZZZZ_DAT.get_view(entry.disk_location, entry.original_size))
     else:
-        found_files = discovery_method()
-        draw_pic(zzzz_file, results_path, join(output_folder, "results.png"))
-        
-    if exists(file_name_path):
-        with open(file_name_path, 'r') as f:
-            file_names = json.load(f)
-        offset_to_name = {int(x['Location'], 16): x['Name'] for x in file_names}
-    else:
-        offset_to_name = {}
+        these_bytes = DECOMPRESSION_CACHE.decompress(ZZZZ_DAT.get_entry_view(entry), entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size)
 
-    print("Interpreting referenced compressed files... (should take about 10 minutes)")
-    for json_entry in progressbar.progressbar(found_files['GameReferencedCompressedFiles']):
-        entry = DataEntry.from_dict(json_entry)
-        if entry.file != zzzz_file:
-            continue
-        
-        this_file = f'{entry.disk_location:08X}'
-        this_folder = join(REFERENCED_FOLDER, this_file)
+    interpret_bytes(these_bytes, this_folder, OUTPUT_FORMAT, PRECISION)
 
-        renamed_file = offset_to_name.get(entry.disk_location, None)
-        if renamed_file != None:
-            renamed_folder = join(REFERENCED_FOLDER, renamed_file)
+    write_bytes(these_bytes, output_file_name)
 
-            if exists(this_folder) and not exists(renamed_folder):
-                rename(this_folder, renamed_folder)
-            
-            this_folder = renamed_folder
-            this_file = renamed_file
+def extract_referenced_raw(entry:DataEntry, this_folder:str, output_file_name:str):
+    these_bytes = bytes(ZZZZ_DAT.get_entry_view(entry))
 
-        output_file_name = join(this_folder, this_file) + ".dat"
+    interpret_bytes(these_bytes, this_folder, OUTPUT_FORMAT, PRECISION)
 
-        if not exists(output_file_name):
-            this_data = ZZZZ_DAT[entry.disk_location : entry.disk_location + entry.compressed_size]
-            if len(this_data) == entry.compressed_size:
-                decompressed_bytes = ArchiveDecompressor(ZZZZ_DAT[entry.disk_location:], entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size).decompress()
-                
-                interpret_bytes(decompressed_bytes, this_folder)
+    write_bytes(these_bytes, output_file_name)
 
-                write_bytes(decompressed_bytes, output_file_name)
-    
-    mean = lambda x : sum(x) // len(x) 
+EXTRACTORS = {
+    'GameReferencedCompressedFiles': extract_referenced_compressed,
+    'UnreferencedCompressedFiles':   extract_unreferenced_compressed,
+    'AdGCForms':                     extract_adgcform,
+    'GameReferencedRawFiles':        extract_referenced_raw,
+}
 
-    print("Interpreting unreferenced compressed files... (this will take 30-45 minutes)")
-    for json_entry in progressbar.progressbar(found_files['UnreferencedCompressedFiles']):
-        entry = DataEntry.from_dict(json_entry)
-        if entry.file != zzzz_file:
-            continue
-        
-        this_file = f'{entry.disk_location:08X}'
-        this_folder = join(UNREFERENCED_FOLDER, this_file)
-
-        renamed_file = offset_to_name.get(entry.disk_location, None)
-        if renamed_file != None:
-            renamed_folder = join(UNREFERENCED_FOLDER, renamed_file)
-
-            if exists(this_folder) and not exists(renamed_folder):
-                rename(this_folder, renamed_folder)
-            
-            this_folder = renamed_folder
-            this_file = renamed_file
-
-        output_file_name = join(this_folder, this_file) + ".dat"
-
-        if not exists(output_file_name):
-            decompressor = RollingDecompressor(ZZZZ_DAT[entry.disk_location:], entry.lookback_bit_size, entry.repetition_bit_size)
-            parts_of_file = get_parts_of_file(decompressor)
-            
-            if len(parts_of_file) > 1:
-                if len(parts_of_file) > 0 and parts_of_file[0] == 80_92_000: # base address is a c3 file
-                    parts_of_file = []
-                else:
-                    # calculate the average size of a section, and decompress that much past the last part start
-                    # hopefully should allow for faster decompressing
-                    average_size = mean([parts_of_file[x+1] - parts_of_file[x] for x in range(len(parts_of_file) - 1)])
-                    try:
-                        decompressed_bytes = decompressor[0:parts_of_file[-1] + average_size]
-                    except:
-                        decompressed_bytes = decompressor
-            else:
-                decompressed_bytes = decompressor
+def extract_entry(category:str, entry:DataEntry, this_folder:str, output_file_name:str) -> Union[str, None]:
+    """Extracts one entry of the archive, returns a description of the failure if it failed."""
+    try:
+        EXTRACTORS[category](entry, this_folder, output_file_name)
+    except Exception:
+        return f"{category} {entry.disk_location:08X} ({this_folder}):\n{format_exc()}"
+    return None
 
-            interpret_bytes(decompressed_bytes, this_folder)
+def get_output_paths(entry:DataEntry, category_folder:str, offset_to_name:dict[int, str]) -> tuple[str, str]:
+    this_file = f'{entry.disk_location:08X}'
+    this_folder = join(category_folder, this_file)
 
-            write_bytes(decompressor.outputdata, output_file_name)
+    renamed_file = offset_to_name.get(entry.disk_location, None)
+    if renamed_file != None:
+        renamed_folder = join(category_folder, renamed_file)
 
-    print("Interpreting AdGCForms files...")
-    for json_entry in progressbar.progressbar(found_files['AdGCForms']):
-        entry = DataEntry.from_dict(json_entry)
-        if entry.file != zzzz_file:
-            continue
+        if exists(this_folder) and not exists(renamed_folder):
+            rename(this_folder, renamed_folder)
         
-        this_file = f'{entry.disk_location:08X}'
-        this_folder = join(ADGCFORMS_FOLDER, this_file)
-
-        renamed_file = offset_to_name.get(entry.disk_location, None)
-        if renamed_file != None:
-            renamed_folder = join(ADGCFORMS_FOLDER, renamed_file)
+        this_folder = renamed_folder
+        this_file = renamed_file
 
-            if exists(this_folder) and not exists(renamed_folder):
-                rename(this_folder, renamed_folder)
-            
-            this_folder = renamed_folder
-            this_file = renamed_file
+    return this_folder, join(this_folder, this_file) + ".dat"
 
-        output_file_name = join(this_folder, this_file) + ".dat"
-
-        if not exists(output_file_name):
-
-            if entry.compression_flag == 0:
-                these_bytes = ZZZZ_DAT[entry.disk_location : entry.disk_location + entry.original_size]
-            else:
-                these_bytes = ArchiveDecompressor(ZZZZ_DAT[entry.disk_location:], entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size).decompress()
+def interpret_US(jobs:int=1, output_format:str='obj', precision:int=None):
+    print('Looking at US files...')
+    return interpret_version(US_OUTPUT_FOLDER, US_RESULTS_FILE, US_ZZZZ_FILE, discover_US_files, US_CUSTOM_FILENAMES, jobs, output_format, precision)
+def interpret_JP(jobs:int=1, output_format:str='obj', precision:int=None):
+    print('Looking at JP files...')
+    return interpret_version(JP_OUTPUT_FOLDER, JP_RESULTS_FILE, JP_ZZZZ_FILE, discover_JP_files, JP_CUSTOM_FILENAMES, jobs, output_format, precision)
+def interpret_EU(jobs:int=1, output_format:str='obj', precision:int=None):
+    print('Looking at EU files...')
+    return interpret_version(EU_OUTPUT_FOLDER, EU_RESULTS_FILE, EU_ZZZZ_FILE, discover_EU_files, EU_CUSTOM_FILENAMES, jobs, output_format, precision)
+def interpret_BETA(jobs:int=1, output_format:str='obj', precision:int=None):
+    print('Looking at Beta files...')
+    return interpret_version(BETA_OUTPUT_FOLDER, BETA_RESULTS_FILE, BETA_ZZZZ_FILE, discover_beta_files, BETA_CUSTOM_FILENAMES, jobs, output_format, precision)
 
-            interpret_bytes(these_bytes, this_folder)
+def main(jobs:int=1, output_format:str='obj', precision:int=None):
+    interpret_US(jobs, output_format, precision)
+    interpret_JP(jobs, output_format, precision)
+    interpret_EU(jobs, output_format, precision)
+    interpret_BETA(jobs, output_format, precision)
 
-            write_bytes(these_bytes, output_file_name)
+def interpret_version(output_folder:str, results_path:str, zzzz_file:str, discovery_method, file_name_path:str, jobs:int=1, output_format:str='obj', precision:int=None):
+    if not exists(zzzz_file):
+        return
 
-    print("Interpreting referenced raw files...")
-    for json_entry in progressbar.progressbar(found_files['GameReferencedRawFiles']):
-        entry = DataEntry.from_dict(json_entry)
-        if entry.file != zzzz_file:
-            continue
+    ensure_dir(output_folder)
+ 
+    # results.json is the file that is read and edited, the catalog is rebuilt from it whenever it changes
+    this_catalog_path = catalog_path(results_path)
+    if catalog_is_current(results_path):
+        catalog = Catalog.load(this_catalog_path)
+    elif exists(results_path):
+        # edited, or found by an older version without a catalog
+        catalog = load_results(results_path)
+        catalog.save(this_catalog_path)
+    else:
+        discovery_method(jobs)
+        catalog = Catalog.load(this_catalog_path)
+        draw_pic(zzzz_file, this_catalog_path, join(output_folder, "results.png"))
         
-        this_file = f'{entry.disk_location:08X}'
-        this_folder = join(RAW_FOLDER, this_file)
-
-        renamed_file = offset_to_name.get(entry.disk_location, None)
-
-        if renamed_file != None:
-            renamed_folder = join(RAW_FOLDER, renamed_file)
-
-            if exists(this_folder) and not exists(renamed_folder):
-                rename(this_folder, renamed_folder)
-            
-            this_folder = renamed_folder
-            this_file = renamed_file
-
-        output_file_name = join(this_folder, this_file) + ".dat"
-
-        if not exists(output_file_name):
-            these_bytes = ZZZZ_DAT[entry.disk_location:entry.disk_location+entry.compressed_size]
-
-            interpret_bytes(these_bytes, this_folder)
-
-            write_bytes(these_bytes, output_file_name)
-
+    if exists(file_name_path):
+        with open(file_name_path, 'r') as f:
+            file_names = json.load(f)
+        offset_to_name = {int(x['Location'], 16): x['Name'] for x in file_names}
+    else:
+        offset_to_name = {}
 
-if __name__ == "__main__": main()
+    executor = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=open_archive, initargs=(zzzz_file, output_format, precision))
+    else:
+        open_archive(zzzz_file, output_format, precision)
+
+    failures = []
+    try:
+        for category, folder_name, message in EXTRACTION_PASSES:
+            # renaming and skipping finished entries happens here, the workers only extract
+            tasks = []
+            for entry in catalog.entries(category, zzzz_file):
+                this_folder, output_file_name = get_output_paths(entry, join(output_folder, folder_name), offset_to_name)
+                if not exists(output_file_name):
+                    tasks.append((category, entry, this_folder, output_file_name))
+
+            print(message)
+            if executor == None:
+                results = (extract_entry(*task) for task in tasks)
+            else:
+                results = (future.result() for future in as_completed([executor.submit(extract_entry, *task) for task in tasks]))
+
+            for failure in progressbar.progressbar(results, max_value=len(tasks)):
+                if failure != None:
+                    failures.append(failure)
+    finally:
+        if executor != None:
+            executor.shutdown(cancel_futures=True)
+
+    if len(failures) > 0:
+        failure_file = join(output_folder, "failures.txt")
+        print(f"{len(failures)} {'entry' if len(failures) == 1 else 'entries'} failed to extract, see {failure_file}")
+        write_text("\n".join(failures), failure_file)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Extract the models and textures from Mario Superstar Baseball")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes extracting files at the same time")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default='obj', help="file format of the extracted models")
+    parser.add_argument("--precision", type=int, default=None, help="decimals of the floats in obj files, all of them if it isn't given")
+    args = parser.parse_args()
+
+    main(max(1, args.jobs), args.format, args.precision)
@@ -0,0 +1,301 @@
+/*
+ * Native version of the MSSB archive codec, see ArchiveDecompressor and
+ * ArchiveCompressor in helper_mssb_data.py for the reference implementation.
+ *
+ * The stream is a list of big endian 32-bit ints. Bits are taken from the low
+ * end of each int. When a read needs more bits than are left in the current
+ * int, the leftover bits become the high bits of the value and the low bits
+ * come from the next int.
+ *
+ * Tokens:
+ *   1, 8 bits                          original data
+ *   0, lookback bits, repetition bits  copy (repetition + 2) bytes starting
+ *                                      (lookback + 1) bytes back
+ */
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define MSSB_OK               0
+#define MSSB_NO_MORE_INTS    -1
+#define MSSB_BAD_LOOKBACK    -2
+#define MSSB_OUTPUT_TOO_SMALL -3
+#define MSSB_NO_MEMORY       -4
+
+typedef struct {
+    const uint8_t *src;
+    size_t buffer_length;
+    size_t word_count;
+    size_t word_index;
+    uint32_t bit_buffer;
+    int bits_in_buffer;
+} bit_reader;
+
+static uint32_t mask_bits(int bit_count)
+{
+    return bit_count >= 32 ? 0xffffffffu : ((1u << bit_count) - 1u);
+}
+
+static int read_bits(bit_reader *r, int bit_count, uint32_t *value)
+{
+    uint32_t new_buffer;
+    int new_bits_needed;
+
+    if (bit_count <= r->bits_in_buffer) {
+        *value = r->bit_buffer & mask_bits(bit_count);
+        r->bit_buffer = bit_count >= 32 ? 0 : r->bit_buffer >> bit_count;
+        r->bits_in_buffer -= bit_count;
+        return MSSB_OK;
+    }
+
+    if (r->word_index >= r->word_count)
+        return MSSB_NO_MORE_INTS;
+
+    new_buffer = ((uint32_t)r->src[r->word_index * 4] << 24) |
+                 ((uint32_t)r->src[r->word_index * 4 + 1] << 16) |
+                 ((uint32_t)r->src[r->word_index * 4 + 2] << 8) |
+                 ((uint32_t)r->src[r->word_index * 4 + 3]);
+    r->word_index++;
+
+    new_bits_needed = bit_count - r->bits_in_buffer;
+    *value = (new_bits_needed >= 32 ? 0 : r->bit_buffer << new_bits_needed) | (new_buffer & mask_bits(new_bits_needed));
+    r->bits_in_buffer = 32 - new_bits_needed;
+    r->bit_buffer = new_bits_needed >= 32 ? 0 : new_buffer >> new_bits_needed;
+    return MSSB_OK;
+}
+
+static int has_bits(const bit_reader *r)
+{
+    if (r->word_index * 4 + 1 >= r->buffer_length)
+        return r->bit_buffer != 0;
+    return 1;
+}
+
+static void init_reader(bit_reader *r, const uint8_t *src, size_t buffer_length, size_t max_byte_count)
+{
+    r->src = src;
+    r->buffer_length = buffer_length;
+    r->word_count = buffer_length / 4;
+    if (max_byte_count / 4 < r->word_count)
+        r->word_count = max_byte_count / 4;
+    r->word_index = 0;
+    r->bit_buffer = 0;
+    r->bits_in_buffer = 0;
+}
+
+/*
+ * Walks the token stream. When dst is NULL nothing is written and only the
+ * validity of every lookback is checked. has_original_size == 0 keeps going
+ * until the stream runs out of set bits.
+ */
+static int walk(const uint8_t *src, size_t buffer_length, size_t max_byte_count,
+                int lookback_bits, int repetition_bits,
+                int has_original_size, size_t original_size,
+                uint8_t *dst, size_t dst_capacity,
+                size_t *consumed, size_t *written)
+{
+    bit_reader r;
+    size_t write_index = 0;
+    uint32_t flag, far_back, repetitions, value;
+    int status = MSSB_OK;
+
+    init_reader(&r, src, buffer_length, max_byte_count);
+
+    while (has_original_size ? write_index < original_size : has_bits(&r)) {
+        if ((status = read_bits(&r, 1, &flag)) != MSSB_OK)
+            break;
+
+        if (flag) {
+            if ((status = read_bits(&r, 8, &value)) != MSSB_OK)
+                break;
+            if (dst != NULL) {
+                if (write_index >= dst_capacity) {
+                    status = MSSB_OUTPUT_TOO_SMALL;
+                    break;
+                }
+                dst[write_index] = (uint8_t)value;
+            }
+            write_index++;
+            continue;
+        }
+
+        if ((status = read_bits(&r, lookback_bits, &far_back)) != MSSB_OK)
+            break;
+        if ((status = read_bits(&r, repetition_bits, &repetitions)) != MSSB_OK)
+            break;
+        repetitions += 2;
+
+        if (far_back >= write_index) {
+            status = MSSB_BAD_LOOKBACK;
+            break;
+        }
+
+        if (dst != NULL) {
+            size_t distance = (size_t)far_back + 1;
+            size_t i;
+            if (write_index + repetitions > dst_capacity) {
+                status = MSSB_OUTPUT_TOO_SMALL;
+                break;
+            }
+            if (distance >= repetitions) {
+                memcpy(dst + write_index, dst + write_index - distance, repetitions);
+            } else {
+                for (i = 0; i < repetitions; i++)
+                    dst[write_index + i] = dst[write_index + i - distance];
+            }
+        }
+        write_index += repetitions;
+    }
+
+    *consumed = r.word_index * 4;
+    *written = write_index;
+    return status;
+}
+
+int mssb_decompress(const uint8_t *src, size_t buffer_length, size_t max_byte_count,
+                    int lookback_bits, int repetition_bits, size_t original_size,
+                    uint8_t *dst, size_t dst_capacity,
+                    size_t *consumed, size_t *written)
+{
+    return walk(src, buffer_length, max_byte_count, lookback_bits, repetition_bits,
+                1, original_size, dst, dst_capacity, consumed, written);
+}
+
+int mssb_is_valid(const uint8_t *src, size_t buffer_length, size_t max_byte_count,
+                  int lookback_bits, int repetition_bits,
+                  int has_original_size, size_t original_size,
+                  size_t *consumed, size_t *written)
+{
+    return walk(src, buffer_length, max_byte_count, lookback_bits, repetition_bits,
+                has_original_size, original_size, NULL, 0, consumed, written);
+}
+
+typedef struct {
+    uint8_t *dst;
+    size_t dst_capacity;
+    size_t length;
+    uint32_t buffer;
+    int buffer_bit_count;
+} bit_writer;
+
+static void write_word(bit_writer *w, uint32_t word)
+{
+    if (w->length + 4 <= w->dst_capacity) {
+        w->dst[w->length] = (uint8_t)(word >> 24);
+        w->dst[w->length + 1] = (uint8_t)(word >> 16);
+        w->dst[w->length + 2] = (uint8_t)(word >> 8);
+        w->dst[w->length + 3] = (uint8_t)word;
+    }
+    w->length += 4;
+}
+
+static void add_bits(bit_writer *w, uint32_t value, int bit_count)
+{
+    int remaining_bits;
+
+    if (w->buffer_bit_count + bit_count <= 32) {
+        w->buffer |= bit_count == 0 ? 0 : value << w->buffer_bit_count;
+        w->buffer_bit_count += bit_count;
+        if (w->buffer_bit_count == 32) {
+            write_word(w, w->buffer);
+            w->buffer = 0;
+            w->buffer_bit_count = 0;
+        }
+        return;
+    }
+
+    /* the remaining bits of this int get the high bits of the value */
+    remaining_bits = 32 - w->buffer_bit_count;
+    w->buffer |= (value >> (bit_count - remaining_bits)) << w->buffer_bit_count;
+    write_word(w, w->buffer);
+    w->buffer = value & mask_bits(bit_count - remaining_bits);
+    w->buffer_bit_count = bit_count - remaining_bits;
+}
+
+/*
+ * Returns the compressed length in bytes, or a negative status. The result
+ * matches ArchiveCompressor: at every position the longest match inside the
+ * lookback window is used, and of equally long matches the first one wins.
+ *
+ * Candidates are bucketed by their first two bytes, in increasing position
+ * order, so the search can stop at the first match of the maximum length.
+ */
+long long mssb_compress(const uint8_t *src, size_t length, int lookback_bits, int repetition_bits,
+                        uint8_t *dst, size_t dst_capacity)
+{
+    const size_t window_size = (size_t)1 << lookback_bits;
+    const size_t max_match = ((size_t)1 << repetition_bits) + 1;
+    size_t key_count = length > 1 ? length - 1 : 0;
+    size_t *bucket_start = NULL, *bucket_fill = NULL, *window_index = NULL, *positions = NULL;
+    size_t data_index = 0, i;
+    bit_writer w = {dst, dst_capacity, 0, 0, 0};
+
+    bucket_start = calloc(0x10001, sizeof(size_t));
+    bucket_fill = calloc(0x10000, sizeof(size_t));
+    window_index = calloc(0x10000, sizeof(size_t));
+    positions = malloc((key_count ? key_count : 1) * sizeof(size_t));
+    if (!bucket_start || !bucket_fill || !window_index || !positions) {
+        free(bucket_start); free(bucket_fill); free(window_index); free(positions);
+        return MSSB_NO_MEMORY;
+    }
+
+    /* counting sort of every position by its two byte prefix */
+    for (i = 0; i < key_count; i++)
+        bucket_start[((size_t)src[i] << 8 | src[i + 1]) + 1]++;
+    for (i = 0; i < 0x10000; i++)
+        bucket_start[i + 1] += bucket_start[i];
+    for (i = 0; i < key_count; i++) {
+        size_t key = (size_t)src[i] << 8 | src[i + 1];
+        positions[bucket_start[key] + bucket_fill[key]++] = i;
+    }
+    for (i = 0; i < 0x10000; i++)
+        window_index[i] = bucket_start[i];
+
+    while (data_index < length) {
+        size_t longest = length - data_index < max_match ? length - data_index : max_match;
+        size_t best_length = 0, best_offset = 0;
+
+        if (longest >= 2) {
+            size_t key = (size_t)src[data_index] << 8 | src[data_index + 1];
+            size_t window_start = data_index > window_size ? data_index - window_size : 0;
+            size_t k = window_index[key], end = bucket_start[key + 1];
+
+            /* the window only moves forward, so the skipped positions never come back */
+            while (k < end && positions[k] < window_start)
+                k++;
+            window_index[key] = k;
+
+            for (; k < end && positions[k] < data_index; k++) {
+                size_t candidate = positions[k], match = 2;
+                while (match < longest && src[candidate + match] == src[data_index + match])
+                    match++;
+                if (match > best_length) {
+                    best_length = match;
+                    best_offset = candidate;
+                    if (match == longest)
+                        break;
+                }
+            }
+        }
+
+        if (best_length >= 2) {
+            add_bits(&w, 0, 1);
+            add_bits(&w, (uint32_t)(data_index - best_offset - 1), lookback_bits);
+            add_bits(&w, (uint32_t)(best_length - 2), repetition_bits);
+            data_index += best_length;
+        } else {
+            add_bits(&w, 1, 1);
+            add_bits(&w, src[data_index], 8);
+            data_index++;
+        }
+    }
+
+    if (w.buffer_bit_count > 0)
+        write_word(&w, w.buffer);
+
+    free(bucket_start); free(bucket_fill); free(window_index); free(positions);
+
+    if (w.length > dst_capacity)
+        return MSSB_OUTPUT_TOO_SMALL;
+    return (long long)w.length;
+}
@@ -0,0 +1,146 @@
+from os.path import exists
+from time import perf_counter
+from random import Random
+import argparse
+
+import helper_mssb_data
+from helper_mssb_data import DataEntry, ArchiveDecompressor, ArchiveCompressor, ArchiveReader, measure
+from helper_file_system import *
+from helper_catalog import load_results
+from helper_texture import TPLTextureHeader, VALID_IMAGE_FORMATS, REV_VALID_IMAGE_FORMATS
+from run_extract_Texture import TEXTURE_PARSE_FUNCTIONS
+
+VERSION_FILES = {
+    "US":   (US_ZZZZ_FILE,   US_RESULTS_FILE),
+    "JP":   (JP_ZZZZ_FILE,   JP_RESULTS_FILE),
+    "EU":   (EU_ZZZZ_FILE,   EU_RESULTS_FILE),
+    "Beta": (BETA_ZZZZ_FILE, BETA_RESULTS_FILE),
+}
+
+def load_compressed_entries(zzzz_file:str, results_file:str, limit:int=None) -> list[DataEntry]:
+    entries = load_results(results_file).entries('GameReferencedCompressedFiles', zzzz_file)
+    entries = [x for x in entries if x.compressed_size > 0]
+
+    if limit != None:
+        entries = entries[:limit]
+    return entries
+
+def print_result(name:str, seconds:float, input_bytes:int, output_bytes:int, count:int):
+    seconds = max(seconds, 1e-9)
+    print(f"{name:<28} {count:>6} entries  {seconds:>8.3f}s  "
+          f"in {input_bytes / seconds / 1e6:>7.2f} MB/s  out {output_bytes / seconds / 1e6:>7.2f} MB/s")
+
+def codec_choices() -> list[bool]:
+    return [False, True] if helper_mssb_data.NATIVE_CODEC_AVAILABLE else [False]
+
+def codec_name(use_native:bool) -> str:
+    return "native" if use_native else "python"
+
+def benchmark_decompression(zzzz_file:str, results_file:str, limit:int=None):
+    entries = load_compressed_entries(zzzz_file, results_file, limit)
+
+    zzzz_dat = ArchiveReader(zzzz_file)
+    compressed = [zzzz_dat.get_entry_view(x) for x in entries]
+
+    for use_native in codec_choices():
+        helper_mssb_data.USE_NATIVE_CODEC = use_native
+
+        start = perf_counter()
+        output_bytes = 0
+        for entry, data in zip(entries, compressed):
+            output_bytes += len(ArchiveDecompressor(data, entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size).decompress())
+        print_result(f"decompress ({codec_name(use_native)})", perf_counter() - start, sum(len(x) for x in compressed), output_bytes, len(entries))
+
+    helper_mssb_data.USE_NATIVE_CODEC = helper_mssb_data.NATIVE_CODEC_AVAILABLE
+
+def benchmark_compression(zzzz_file:str, results_file:str, limit:int=None):
+    entries = load_compressed_entries(zzzz_file, results_file, limit)
+
+    zzzz_dat = ArchiveReader(zzzz_file)
+    decompressed = [ArchiveDecompressor(zzzz_dat.get_entry_view(x), x.lookback_bit_size, x.repetition_bit_size, x.original_size).decompress() for x in entries]
+
+    for use_native in codec_choices():
+        helper_mssb_data.USE_NATIVE_CODEC = use_native
+
+        start = perf_counter()
+        output_bytes = 0
+        for entry, data in zip(entries, decompressed):
+            output_bytes += len(ArchiveCompressor(data, entry.lookback_bit_size, entry.repetition_bit_size).compress())
+        print_result(f"compress ({codec_name(use_native)})", perf_counter() - start, sum(len(x) for x in decompressed), output_bytes, len(entries))
+
+    helper_mssb_data.USE_NATIVE_CODEC = helper_mssb_data.NATIVE_CODEC_AVAILABLE
+
+def benchmark_measure(zzzz_file:str, results_file:str, limit:int=None):
+    entries = load_compressed_entries(zzzz_file, results_file, limit)
+
+    zzzz_dat = ArchiveReader(zzzz_file)
+    compressed = [zzzz_dat.get_entry_view(x) for x in entries]
+
+    for use_native in codec_choices():
+        helper_mssb_data.USE_NATIVE_CODEC = use_native
+
+        for name, run in [
+            ("decompress", lambda entry, data: len(ArchiveDecompressor(data, entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size).decompress())),
+            ("measure",    lambda entry, data: measure(data, entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size).decompressed_size),
+        ]:
+            start = perf_counter()
+            output_bytes = 0
+            for entry, data in zip(entries, compressed):
+                output_bytes += run(entry, data)
+            print_result(f"{name} ({codec_name(use_native)})", perf_counter() - start, sum(len(x) for x in compressed), output_bytes, len(entries))
+
+    helper_mssb_data.USE_NATIVE_CODEC = helper_mssb_data.NATIVE_CODEC_AVAILABLE
+
+TEXTURE_BITS_PER_TEXEL = {
+    "I4": 4, "I8": 8, "IA4": 8, "IA8": 16, "RGB565": 16, "RGB5A3": 16,
+    "RGBA32": 32, "C4": 4, "C8": 8, "C14X2": 16, "CMPR": 4,
+}
+
+def benchmark_textures(zzzz_file:str, results_file:str, limit:int=None):
+    # random texels, every format decodes the same sized image
+    width, height = 256, 256
+    palette_size = 0x4000 * 2
+    rng = Random(0)
+    source = bytes(rng.randrange(256) for _ in range(palette_size + width * height * 4))
+    count = limit if limit != None else 20
+
+    for name in VALID_IMAGE_FORMATS.values():
+        header = TPLTextureHeader(address=palette_size, height=height, width=width, format=REV_VALID_IMAGE_FORMATS[name], palette=0, palette_format=REV_VALID_IMAGE_FORMATS['RGB5A3'])
+        TEXTURE_PARSE_FUNCTIONS[name](source, header) # builds the color tables outside of the timing
+
+        start = perf_counter()
+        for _ in range(count):
+            image = TEXTURE_PARSE_FUNCTIONS[name](source, header)
+        seconds = perf_counter() - start
+
+        texel_bytes = width * height * TEXTURE_BITS_PER_TEXEL[name] // 8
+        print_result(f"texture {name}", seconds, texel_bytes * count, len(image.tobytes()) * count, count)
+
+BENCHMARKS = {
+    "decompress": benchmark_decompression,
+    "compress": benchmark_compression,
+    "measure": benchmark_measure,
+    "textures": benchmark_textures,
+}
+
+# benchmarks that read the entries of an extracted archive
+ARCHIVE_BENCHMARKS = ["decompress", "compress", "measure"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the archive codecs against the entries found in a ZZZZ.dat")
+    parser.add_argument("--version", choices=VERSION_FILES.keys(), default="US")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N entries")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS.keys(), help="run only this benchmark, can be given more than once")
+    args = parser.parse_args()
+
+    zzzz_file, results_file = VERSION_FILES[args.version]
+    have_archive = exists(zzzz_file) and exists(results_file)
+
+    for name in args.only or BENCHMARKS.keys():
+        if name in ARCHIVE_BENCHMARKS and not have_archive:
+            print(f"Skipping {name}, {zzzz_file} and {results_file} are needed, run main.py for this version first.")
+            continue
+        BENCHMARKS[name](zzzz_file, results_file, args.limit)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
 from PIL import Image
-import json, math
-from helper_mssb_data import DataEntry, MultipleRanges, dirname, ensure_dir
-import progressbar
+import math
+from helper_mssb_data import MultipleRanges, dirname, ensure_dir
+from helper_catalog import load_results
+import numpy as np
+from os.path import getsize
 
 def draw_pic(zzzz_path:str, results_path:str, output_path="found.png"):
-    with open(results_path, 'r') as f:
-        results = json.load(f)
+    # a results.json or a catalog
+    catalog = load_results(results_path)
 
-    with open(zzzz_path, 'rb') as f:
-        data_length = len(f.read())
+    data_length = getsize(zzzz_path)
 
     square_size = math.sqrt(data_length//0x800)
 
@@ -17,25 +18,20 @@ def draw_pic(zzzz_path:str, results_path:str, output_path="found.png"):
     else:
         square_size = int(square_size)
 
-    referencedCompressedRanges = MultipleRanges()
-    for entry_json in results['GameReferencedCompressedFiles']:
-        referencedCompressedRanges.add_range(DataEntry.from_dict(entry_json).to_range())
+    def entry_ranges(category:str) -> MultipleRanges:
+        records = catalog.by_category(category)
+        ranges = MultipleRanges()
+        ranges.add_ranges([range(start, stop) for start, stop in zip(records['offset'].tolist(), catalog.stops(records).tolist())])
+        return ranges
 
-    referencedUncompressedRanges = MultipleRanges()
-    for entry_json in results['GameReferencedRawFiles']:
-        referencedUncompressedRanges.add_range(DataEntry.from_dict(entry_json).to_range())
+    referencedCompressedRanges = entry_ranges('GameReferencedCompressedFiles')
 
-    unreferencedCompressedRanges= MultipleRanges()
-    for entry_json in results['UnreferencedCompressedFiles']:
-        entry = DataEntry.from_dict(entry_json)
-        unreferencedCompressedRanges.add_range(range(entry.disk_location, entry.disk_location+100))
+    referencedUncompressedRanges = entry_ranges('GameReferencedRawFiles')
 
-    adGCRanges = MultipleRanges()
-    for entry_json in results['AdGCForms']:
-        entry = DataEntry.from_dict(entry_json)
-        adGCRanges.add_range(DataEntry.from_dict(entry_json).to_range())
+    unreferencedCompressedRanges= MultipleRanges()
+    unreferencedCompressedRanges.add_ranges([range(x, x+100) for x in catalog.by_category('UnreferencedCompressedFiles')['offset'].tolist()])
 
-    img = Image.new('RGB', (square_size, square_size), (0,0,0))
+    adGCRanges = entry_ranges('AdGCForms')
 
     WHITE_PIXEL  = (255, 255, 255)
     CYAN_PIXEL   = (0,255,255)
@@ -43,15 +39,20 @@ def draw_pic(zzzz_path:str, results_path:str, output_path="found.png"):
     RED_PIXEL    = (255, 0, 0)
     GREEN_PIXEL  = (0, 255, 0)
     print('Drawing ZZZZ picture...')
-    for i, address in progressbar.progressbar([x for x in enumerate(range(0, data_length, 0x800))]):
-        
-        if   address in referencedCompressedRanges:     pix = CYAN_PIXEL
-        elif address in referencedUncompressedRanges:   pix = ORANGE_PIXEL
-        elif address in unreferencedCompressedRanges:   pix = RED_PIXEL
-        elif address in adGCRanges:                     pix = GREEN_PIXEL
-        else:                                           pix = WHITE_PIXEL
-        
-        img.putpixel((i % square_size, i // square_size), pix)
+    addresses = np.arange(0, data_length, 0x800)
+
+    # one pixel per 0x800 block, the first matching range type picks the color
+    pixels = np.zeros((square_size * square_size, 3), dtype=np.uint8)
+    pixels[:len(addresses)] = WHITE_PIXEL
+    for ranges, pix in reversed([
+        (referencedCompressedRanges,   CYAN_PIXEL),
+        (referencedUncompressedRanges, ORANGE_PIXEL),
+        (unreferencedCompressedRanges, RED_PIXEL),
+        (adGCRanges,                   GREEN_PIXEL),
+    ]):
+        pixels[:len(addresses)][ranges.contains_many(addresses)] = pix
+
+    img = Image.fromarray(pixels.reshape(square_size, square_size, 3))
     
     ensure_dir(dirname(output_path))
 
@@ -4,14 +4,29 @@ from helper_obj_file import *
 from helper_c3 import *
 from helper_mssb_data import *
 
-from helper_mssb_data import get_parts_of_file, float_from_fixedpoint
+from helper_mssb_data import get_parts_of_file
+from helper_gltf import GLBFile, ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER
+from helper_texture import ExtractedTextureCollection
+from dataclasses import dataclass
+from io import BytesIO
+import typing
+import numpy as np
 
 def main():
     file_name = input("Input file name: ")
     part_of_file = int(input("Input part of file: "))
     export_model(file_name, dirname(file_name), part_of_file)
 
-def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, mtl_header:str = ""):
+@dataclass
+class Geometry:
+    """The vertices of a geometry descriptor, with a (faces, texture index, comments) for every draw."""
+    name:str
+    positions:np.ndarray
+    textures:np.ndarray
+    normals:np.ndarray
+    draws:list[tuple[OBJFaces, int, list[str]]]
+
+def parse_geometries(file_bytes:bytearray, part_of_file = 2) -> typing.Iterator[Geometry]:
 
     parts_of_file = get_parts_of_file(file_bytes)
 
@@ -45,17 +60,14 @@ def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, m
             dop.componentSize, 
             dop.componentSize * dop.numberOfComponents,
             dop.componentShift,
-            dop.componentSigned,
-            PositionVector
-            )
+            dop.componentSigned)
 
         doc = DisplayObjectColorHeader(file_bytes, dol.OffsetToColorData)
         doc.add_offset(dol_offset)
 
         dot = []
         tex_coords = []
-        for i in range(dol.numberOfTextures):
-            dd = DisplayObjectTextureHeader(file_bytes, dol.OffsetToTextureData + i * DisplayObjectTextureHeader.SIZE_OF_STRUCT)
+        for i, dd in enumerate(DisplayObjectTextureHeader.parse_many(file_bytes, dol.OffsetToTextureData, dol.numberOfTextures)):
             dd.add_offset(dol_offset)
 
             dd.name = get_c_str(file_bytes, dd.offsetToTexturePaletteFileName)
@@ -69,9 +81,7 @@ def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, m
                     dd.componentSize, 
                     dd.componentSize * dd.numberOfComponents,
                     dd.componentShift, 
-                    dd.componentSigned,
-                    TextureVector
-                    )
+                    dd.componentSigned)
 
         doli = DisplayObjectLightingHeader(file_bytes, dol.OffsetToLightingData)
         doli.add_offset(dol_offset)
@@ -82,14 +92,12 @@ def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, m
             doli.componentSize, 
             doli.componentSize * doli.numberOfComponents, 
             doli.componentShift, 
-            doli.componentSigned,
-            NormalVector
-            )
+            doli.componentSigned)
 
         dod = DisplayObjectDisplayHeader(file_bytes, dol.OffsetToDisplayData)
         dod.add_offset(dol_offset)
 
-        dods = [DisplayObjectDisplayState(file_bytes, dod.offsetToDisplayStateList + i * DisplayObjectDisplayState.SIZE_OF_STRUCT) for i in range(dod.numberOfDisplayStateEntries)]
+        dods = DisplayObjectDisplayState.parse_many(file_bytes, dod.offsetToDisplayStateList, dod.numberOfDisplayStateEntries)
         all_draws = []
         # print(d)
 
@@ -106,23 +114,7 @@ def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, m
                     texture_index = dod.setting & 0xff
                     # print(f"loading Texture {texture_index}")
             elif dod.stateID == 2: # Vertex Description
-
-                size_conversion = {
-                0:0,
-                2:1,
-                3:2
-                }
-                all_components = [(dod.setting >> (j * 2)) & 3 for j in range(13)]
-                all_sizes = [size_conversion[j] for j in all_components]
-                comps = {
-                    "vector_size": sum(all_sizes),
-                    "pos_size": all_sizes[1],
-                    "pos_offset": sum(all_sizes[:1]),
-                    "norm_size": all_sizes[2],
-                    "norm_offset": sum(all_sizes[:2]),
-                    "uv_size": all_sizes[5],
-                    "uv_offset": sum(all_sizes[:5]),
-                }
+                vertex_format = get_vertex_format(dod.setting)
 
             elif dod.stateID == 3: # Matrix Load
                 matrix_src = dod.setting >> 16
@@ -131,21 +123,24 @@ def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, m
                 raise ValueError(f"Unknown Display Call: {dod.stateID}")
 
             if(dod.offsetToPrimitiveList != 0):
-                tris = parse_indices(file_bytes[dod.offsetToPrimitiveList:][:dod.byteLengthPrimitiveList], **comps)
+                tris = parse_indices(file_bytes[dod.offsetToPrimitiveList:][:dod.byteLengthPrimitiveList], vertex_format)
                 # these_tris.extend(tris)
                 all_draws.append((tris, texture_index, [f"Using Texture {texture_index}", f"Using Matrix {matrix_src}, {matrix_dst}", f"Display Object {dod_i}"]))
 
+        yield Geometry(d.name, poss, tex_coords, norms, all_draws)
 
-        # Write to Obj
+def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, mtl_header:str = "", precision:int = None):
+    """Writes an obj for every geometry descriptor of a part, precision is the number of decimals of the floats, all of them if it is None."""
+    for geometry in parse_geometries(file_bytes, part_of_file):
         coord_group = OBJGroup(
-            positions=poss,
-            textures=tex_coords,
-            normals=norms,
+            positions=geometry.positions,
+            textures=geometry.textures,
+            normals=geometry.normals,
             faces=[],
             comments=[]
             )
 
-        draw_groups = [OBJGroup(positions=[], textures=[], normals=[], faces=gg[0], mtl=f"mssbMtl.{gg[1]}" if gg[1] != None else None, name=f"group{obj_part}", comments=gg[2]) for obj_part, gg in enumerate(all_draws)]
+        draw_groups = [OBJGroup(positions=[], textures=[], normals=[], faces=gg[0], mtl=f"mssbMtl.{gg[1]}" if gg[1] != None else None, name=f"group{obj_part}", comments=gg[2]) for obj_part, gg in enumerate(geometry.draws)]
         
         draw_groups = [coord_group] + draw_groups
 
@@ -158,80 +153,175 @@ def export_model(file_bytes:bytearray, output_directory:str, part_of_file = 2, m
         # if not obj_file.assert_valid():
         #     debug = 0
 
-        write_text(str(obj_file), join(output_directory, d.name + ".obj"))
-
-def parse_array_values(b:bytes, component_count:int, component_width:int, struct_size:int, fixed_point:int, signed:bool, cls=None)->list:
-    to_return = []
-    offset = 0
-    while offset < len(b):
-        c = []
-        these_b = b[offset:][:struct_size]
-        for i in range(component_count):
-            ii = int.from_bytes(these_b[i*component_width:][:component_width], 'big', signed=signed)
-            f = float_from_fixedpoint(ii, fixed_point)
-            c.append(f)
-        to_return.append(c)        
-        offset += struct_size
-    if cls == None:
-        return to_return
-    else:
-        return [cls(*x) for x in to_return]
-
-def parse_quads(l: list, cls=None) -> list:
-    to_return = []
-    assert(len(l) % 4 == 0)
-    for i in range(len(l) // 4):
-        ii = i*4
-        to_return.append((l[ii+0], l[ii+1], l[ii+2]))
-        to_return.append((l[ii+2], l[ii+3], l[ii+0]))
-    if cls == None:
-        return to_return
-    else:
-        return [cls(*x) for x in to_return]
-
-def parse_triangles(l: list, cls=None) -> list:
-    to_return = []
-    assert(len(l) % 3 == 0)
-    for i in range(len(l) // 3):
-        ii = i*3
-        to_return.append((l[ii+0], l[ii+1], l[ii+2]))
-    if cls == None:
-        return to_return
-    else:
-        return [cls(*x) for x in to_return]
-
-def parse_fan(l: list, cls=None) -> list:
-    to_return = []
-    for i in range(len(l) - 2):
-        to_return.append((l[0], l[i+1], l[i+2]))
-    if cls == None:
-        return to_return
-    else:
-        return [cls(*x) for x in to_return]
-
-def parse_strip(l: list, cls=None) -> list:
-    to_return = []
-    for i in range(len(l) - 2):
-        if i%2 == 0:
-            to_return.append((l[i], l[i+1], l[i+2]))
-        else:
-            to_return.append((l[i+2], l[i+1], l[i]))
-    if cls == None:
-        return to_return
-    else:
-        return [cls(*x) for x in to_return]
-
-def parse_indices(b: bytes, **kwargs) -> list:
-    vector_size = kwargs["vector_size"]
-    pos_size = kwargs["pos_size"]
-    pos_offset = kwargs["pos_offset"]
-    norm_size = kwargs["norm_size"]
-    norm_offset = kwargs["norm_offset"]
-    uv_size = kwargs["uv_size"]
-    uv_offset = kwargs["uv_offset"]
+        obj_file.save(join(output_directory, geometry.name + ".obj"), precision)
+
+# (glTF attribute, Geometry and OBJFaces field, sign of every component)
+# y and z are flipped the same way as in the obj files, texture coordinates start at the top in both the game and glTF
+GLB_ATTRIBUTES = [
+    ("POSITION",   "positions", [1, -1, -1]),
+    ("NORMAL",     "normals",   [1, -1, -1]),
+    ("TEXCOORD_0", "textures",  [1, 1]),
+]
+
+def add_glb_geometry(glb:GLBFile, geometry:Geometry, materials:dict[int, int]):
+    """Adds the geometry as a node, every draw is a primitive using the material of its texture index in materials."""
+    draws = [x for x in geometry.draws if len(x[0]) > 0]
+    # glTF has one index per vertex, an attribute is only kept if every draw indexes it
+    attributes = []
+    for key, field, signs in GLB_ATTRIBUTES:
+        values = np.asarray(getattr(geometry, field), dtype=np.float32).reshape(-1, len(signs))
+        if len(values) > 0 and all(getattr(x[0], field) is not None for x in draws):
+            attributes.append((key, field, values * np.float32(signs)))
+
+    if len(draws) == 0 or len(attributes) == 0 or attributes[0][0] != "POSITION":
+        return
+
+    # every corner's indices, the distinct ones are the vertices
+    corners = np.concatenate([np.stack([getattr(faces, field).reshape(-1) for _, field, _ in attributes], axis=1) for faces, _, _ in draws])
+    for i, (key, _, values) in enumerate(attributes):
+        if corners[:, i].max() >= len(values):
+            raise ValueError(f"{geometry.name} indexes {key} {corners[:, i].max()} of {len(values)}")
+    # one number for the indices of a corner is much faster to find the distinct ones of than rows
+    sizes = np.array([len(values) for _, _, values in attributes], dtype=np.int64)
+    places = np.cumprod(np.concatenate([[1], sizes[:-1]]))
+    keys, vertex_indices = np.unique(corners.astype(np.int64) @ places, return_inverse=True)
+    vertices = keys[:, None] // places % sizes
+    # 0xFFFF is the primitive restart value, glTF doesn't allow it as a uint16 index
+    vertex_indices = vertex_indices.reshape(-1).astype(np.uint16 if len(vertices) <= 0xFFFF else np.uint32)
+
+    accessors = {key: glb.add_accessor(values[vertices[:, i]], ARRAY_BUFFER) for i, (key, _, values) in enumerate(attributes)}
+
+    primitives = []
+    start = 0
+    for faces, texture_index, _ in draws:
+        primitive = {"attributes": accessors, "indices": glb.add_accessor(vertex_indices[start:start + len(faces) * 3], ELEMENT_ARRAY_BUFFER)}
+        if texture_index in materials:
+            primitive["material"] = materials[texture_index]
+        primitives.append(primitive)
+        start += len(faces) * 3
+
+    glb.add_mesh(geometry.name, primitives)
+
+def export_model_glb(file_bytes:bytearray, output_file:str, part_of_file = 2, images:ExtractedTextureCollection = None):
+    """Writes the geometry descriptors of a part as the nodes of one glb, with the part's images embedded as its textures."""
+    geometries = list(parse_geometries(file_bytes, part_of_file))
+
+    glb = GLBFile()
+    materials = {}
+    texture_indices = set(x[1] for geometry in geometries for x in geometry.draws if x[1] != None)
+    for texture_index in sorted(texture_indices):
+        texture = None
+        if images != None and texture_index < len(images.images):
+            png = BytesIO()
+            images.images[texture_index].img.save(png, "png")
+            texture = glb.add_image(png.getvalue(), f"{texture_index}.png")
+        materials[texture_index] = glb.add_material(f"mssbMtl.{texture_index}", texture)
+
+    for geometry in geometries:
+        add_glb_geometry(glb, geometry, materials)
+
+    if len(glb.gltf["nodes"]) > 0:
+        glb.save(output_file)
+
+# big endian numpy types of the quantized components by width, the sign is applied after reading
+QUANTIZED_DTYPES = {
+    1: '>u1',
+    2: '>u2',
+    4: '>u4',
+}
+
+def parse_array_values(b:bytes, component_count:int, component_width:int, struct_size:int, fixed_point:int, signed:bool) -> np.ndarray:
+    """The fixed point vectors in b as an (N, component_count) float64 array.
+
+    A component cut short by the end of its struct or of b is read as a shorter int from the bytes it has, a component with none is 0.
+    """
+    if component_width not in QUANTIZED_DTYPES:
+        raise ValueError(f"Unsupported quantized format, {component_width} byte {'signed' if signed else 'unsigned'} components")
+    if struct_size <= 0 or len(b) == 0:
+        return np.zeros((0, component_count), dtype=np.float64)
+
+    # padded so the last struct and components past the struct can be read
+    count = -(-len(b) // struct_size)
+    data = np.zeros(count * struct_size + component_count * component_width, dtype=np.uint8)
+    data[:len(b)] = np.frombuffer(b, dtype=np.uint8)
+
+    raw = np.ndarray((count, component_count), dtype=QUANTIZED_DTYPES[component_width], buffer=data, strides=(struct_size, component_width)).astype(np.int64)
+
+    # how many bytes of every component are inside both its struct and b
+    struct_ends = np.minimum((np.arange(count) + 1) * struct_size, len(b))
+    component_starts = np.arange(count)[:, None] * struct_size + np.arange(component_count) * component_width
+    available = np.clip(struct_ends[:, None] - component_starts, 0, component_width)
+
+    # the first bytes of a component are its high bytes, a short component is the int of just those
+    values = raw >> (8 * (component_width - available))
+    if signed:
+        bits = 8 * available
+        values = np.where((available > 0) & (values >= (1 << np.maximum(bits - 1, 0))), values - (1 << bits), values)
+
+    # float64 like the int / (1 << shift) this always was, so 4 byte components keep every bit
+    return values.astype(np.float64) * 2.0 ** -fixed_point
+
+# bytes of an attribute index by its 2 bit type in the vertex description
+VERTEX_INDEX_SIZES = {
+    0:0,
+    2:1,
+    3:2,
+}
+VERTEX_INDEX_DTYPES = {
+    1:'>u1',
+    2:'>u2',
+}
+# (field name, attribute number in the vertex description)
+VERTEX_ATTRIBUTES = [
+    ("position", 1),
+    ("normal", 2),
+    ("texture", 5),
+]
+
+def get_vertex_format(setting:int) -> np.dtype:
+    """The layout of a vertex in the primitive lists, a dtype with a field for every attribute index it has."""
+    sizes = [VERTEX_INDEX_SIZES[(setting >> (j * 2)) & 3] for j in range(13)]
+    fields = {name: (VERTEX_INDEX_DTYPES[sizes[j]], sum(sizes[:j])) for name, j in VERTEX_ATTRIBUTES if sizes[j] > 0}
+    return np.dtype({
+        "names": list(fields.keys()),
+        "formats": [x[0] for x in fields.values()],
+        "offsets": [x[1] for x in fields.values()],
+        "itemsize": sum(sizes),
+    })
+
+def parse_quads(count:int) -> np.ndarray:
+    assert(count % 4 == 0)
+    return (np.arange(0, count, 4)[:, None, None] + np.array([[0, 1, 2], [2, 3, 0]])).reshape(-1, 3)
+
+def parse_triangles(count:int) -> np.ndarray:
+    assert(count % 3 == 0)
+    return np.arange(count).reshape(-1, 3)
+
+def parse_fan(count:int) -> np.ndarray:
+    i = np.arange(max(count - 2, 0))
+    return np.stack([np.zeros_like(i), i + 1, i + 2], axis=1)
+
+def parse_strip(count:int) -> np.ndarray:
+    i = np.arange(max(count - 2, 0))
+    triangles = np.stack([i, i + 1, i + 2], axis=1)
+    # every other triangle is turned around to keep the winding
+    triangles[1::2] = triangles[1::2, ::-1]
+    return triangles
+
+# the triangles of a draw command's vertices, by the command >> 3
+TRIANGULATIONS = {
+    0x10: parse_quads, # Draw Quads
+    0x12: parse_triangles, # Draw Triangles
+    0x13: parse_strip, # Draw Triangle Strip
+    0x14: parse_fan, # Draw Triangle Fan
+}
+
+def parse_indices(b: bytes, vertex_format:np.dtype) -> OBJFaces:
+    vector_size = vertex_format.itemsize
     offset = 0
 
-    faces_to_return = []
+    faces = {name: [] for name in vertex_format.names}
+    face_count = 0
     while offset < len(b):
         command = b[offset]
         offset+=1
@@ -244,52 +334,23 @@ def parse_indices(b: bytes, **kwargs) -> list:
         elif command == 0x00: # nop
             continue
         
-        new_tris = []
         shifted_command = command >> 3
         if shifted_command in [0x10, 0x12, 0x13, 0x14, 0x15, 0x16, 0x17]:
             assert(command & 0x7 == 0)
             count = int.from_bytes(b[offset:][:2], 'big')
             offset += 2
-            for i in range(count):
-                v = b[offset:][:vector_size]
-                vertex_parts = []
-                if pos_size > 0:
-                    pos = int.from_bytes(v[pos_offset:][:pos_size], 'big')
-                else:
-                    pos = None
-                
-                if norm_size > 0:
-                    norm = int.from_bytes(v[norm_offset:][:norm_size], 'big')
-                else:
-                    norm = None
-                
-                if uv_size > 0:
-                    uv = int.from_bytes(v[uv_offset:][:uv_size], 'big')
-                else:
-                    uv = None
-
-                new_tris.append(OBJIndices(
-                    position_coordinate=OBJIndex(pos),
-                    normal_coordinate=OBJIndex(norm),
-                    texture_coordinate=OBJIndex(uv)
-                ))
-                offset += vector_size
+
+            # the whole vertex block at once, a list cut short reads as zeros
+            vertex_bytes = bytes(b[offset:offset + count * vector_size])
+            vertex_bytes += bytes(count * vector_size - len(vertex_bytes))
+            vertices = np.frombuffer(vertex_bytes, dtype=vertex_format, count=count) if vector_size > 0 else None
+            offset += count * vector_size
         else:
             print(f"Unrecognized command: {hex(command)}")
             assert(False)
 
-        if shifted_command == 0x10: # Draw Quads
-            new_tris = parse_quads(new_tris)
-            # new_tris = []
-        elif shifted_command == 0x12: # Draw Triangles
-            new_tris = parse_triangles(new_tris)
-            # new_tris = []
-        elif shifted_command == 0x13: # Draw Triangle Strip
-            new_tris = parse_strip(new_tris)
-            # new_tris = []
-        elif shifted_command == 0x14: # Draw Triangle Fan
-            new_tris = parse_fan(new_tris)
-            # new_tris = []
+        if shifted_command in TRIANGULATIONS:
+            triangles = TRIANGULATIONS[shifted_command](count)
         elif shifted_command == 0x15: # Draw Lines
             print("Unimplemented Draw command")
             assert(False)
@@ -299,13 +360,17 @@ def parse_indices(b: bytes, **kwargs) -> list:
         elif shifted_command == 0x17: # Draw Points
             print("Unimplemented Draw command")
             assert(False)
-        else:
-            print("Unknown Draw command")
-            assert(False)
 
-        faces_to_return.extend(new_tris)
-    
-    return [OBJFace(face) for face in faces_to_return]
+        for name in vertex_format.names:
+            faces[name].append(vertices[name][triangles].astype(np.int32))
+        face_count += len(triangles)
+
+    def join(name:str) -> np.ndarray:
+        if name not in faces:
+            return None
+        return np.concatenate(faces[name]) if len(faces[name]) > 0 else np.zeros((0, 3), dtype=np.int32)
+
+    return OBJFaces(face_count, positions=join("position"), textures=join("texture"), normals=join("normal"))
 
 if __name__ == "__main__":
     main()
@@ -22,25 +22,19 @@ def main():
 def get_all_tpl_headers(b:bytes) -> list[TPLTextureHeader]:
     image_count = int.from_bytes(b[:2], 'big', signed=False)
 
-    image_headers = []
-
-    for i in range(image_count):
-        image_headers.append(TPLTextureHeader.from_bytes(b, 4 + TPLTextureHeader.SIZE_OF_STRUCT * i))
-    return image_headers
-
-def unimplemented_format(err:str):
-    raise ValueError(f"Parsing texture format \"{err}\" is not implemented.")
+    return TPLTextureHeader.from_bytes_many(b, 4, image_count)
 
 TEXTURE_PARSE_FUNCTIONS = {
-    "I4":     (lambda a, b: unimplemented_format("I4")),
-    "I8":     (lambda a, b: unimplemented_format("I8")),
-    "IA4":    (lambda a, b: unimplemented_format("IA4")),
-    "RGB565": (lambda a, b: unimplemented_format("RGB565")),
-    "RGB5A3": (lambda a, b: unimplemented_format("RGB5A3")),
-    "RGBA32": (lambda a, b: unimplemented_format("RGBA32")),
+    "I4":     (lambda a, b: TPLFileI4.parse_source(a, b)),
+    "I8":     (lambda a, b: TPLFileI8.parse_source(a, b)),
+    "IA4":    (lambda a, b: TPLFileIA4.parse_source(a, b)),
+    "IA8":    (lambda a, b: TPLFileIA8.parse_source(a, b)),
+    "RGB565": (lambda a, b: TPLFileRGB565.parse_source(a, b)),
+    "RGB5A3": (lambda a, b: TPLFileRGB5A3.parse_source(a, b)),
+    "RGBA32": (lambda a, b: TPLFileRGBA32.parse_source(a, b)),
     "C4":     (lambda a, b: TPLFileC4.parse_source(a, b)),
     "C8":     (lambda a, b: TPLFileC8.parse_source(a, b)),
-    "C14X2":  (lambda a, b: unimplemented_format("C14X2")),
+    "C14X2":  (lambda a, b: TPLFileC14X2.parse_source(a, b)),
     "CMPR":   (lambda a, b: TPLFileCMPR.parse_source(a, b)),
 }
 
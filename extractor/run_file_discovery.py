@@ -1,11 +1,22 @@
 from os.path import exists, dirname, join
 from os import makedirs
-from helper_mssb_data import DataEntry, FileCache, FingerPrintSearcher, MultipleRanges, ArchiveDecompressor, ensure_dir, write_text, write_bytes
-import json, progressbar
-from struct import unpack
+from helper_mssb_data import DataEntry, FileCache, FingerPrintSearcher, MultipleRanges, ArchiveDecompressor, ensure_dir, write_text, write_bytes, max_compressed_size, probe_compressed_offsets, decode_lengths, measure, RollingDecompressor
+import progressbar
+import numpy as np
+from struct import unpack_from
+from bisect import bisect_right
+from itertools import repeat
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from argparse import ArgumentParser
 from helper_file_system import *
+from helper_decompression_cache import DecompressionCache
+from helper_catalog import Catalog, catalog_path
+from helper_checkpoint import Checkpoint, write_json_atomic, entries_to_json, entries_from_json
 
 file_cache = FileCache()
+# made the first time something is decompressed, not when this is imported
+decompression_cache:DecompressionCache = None
 
 for file in [US_AAAA_FILE, US_ZZZZ_FILE, US_MAIN_FILE]:
     if not exists(file):
@@ -92,61 +103,46 @@ KNOWN_COMPRESSED_FILES = [
     })
 ]
 
-def discover_US_files():
-    return discover_files(US_MAIN_FILE, US_AAAA_FILE, US_ZZZZ_FILE, US_OUTPUT_FOLDER, KNOWN_RAW_MOVIES, KNOWN_AAAA_FILES + KNOWN_COMPRESSED_FILES, US_RESULTS_FILE)
+# (lookback, repetition) pairs tried by the discovery sweep, the first ones win a tie
+SWEEP_FORMATS = [(11, 4), (0xe, 5), (8, 3), (4, 2)]
+# how far the sweep decodes to rank the formats of an offset
+SWEEP_RANK_SIZE = 0x800
 
-def discover_JP_files():
-    return discover_files(JP_MAIN_FILE, JP_AAAA_FILE, JP_ZZZZ_FILE, JP_OUTPUT_FOLDER, [], [], JP_RESULTS_FILE)
+def discover_US_files(jobs:int=1, sweep_formats:list[tuple]=None):
+    return discover_files(US_MAIN_FILE, US_AAAA_FILE, US_ZZZZ_FILE, US_OUTPUT_FOLDER, KNOWN_RAW_MOVIES, KNOWN_AAAA_FILES + KNOWN_COMPRESSED_FILES, US_RESULTS_FILE, jobs, sweep_formats)
 
-def discover_EU_files():
-    return discover_files(EU_MAIN_FILE, EU_AAAA_FILE, EU_ZZZZ_FILE, EU_OUTPUT_FOLDER, [], [], EU_RESULTS_FILE)
+def discover_JP_files(jobs:int=1, sweep_formats:list[tuple]=None):
+    return discover_files(JP_MAIN_FILE, JP_AAAA_FILE, JP_ZZZZ_FILE, JP_OUTPUT_FOLDER, [], [], JP_RESULTS_FILE, jobs, sweep_formats)
 
-def discover_beta_files():
-    return discover_files(BETA_MAIN_FILE, BETA_AAAA_FILE, BETA_ZZZZ_FILE, BETA_OUTPUT_FOLDER, [], [], BETA_RESULTS_FILE)
+def discover_EU_files(jobs:int=1, sweep_formats:list[tuple]=None):
+    return discover_files(EU_MAIN_FILE, EU_AAAA_FILE, EU_ZZZZ_FILE, EU_OUTPUT_FOLDER, [], [], EU_RESULTS_FILE, jobs, sweep_formats)
 
+def discover_beta_files(jobs:int=1, sweep_formats:list[tuple]=None):
+    return discover_files(BETA_MAIN_FILE, BETA_AAAA_FILE, BETA_ZZZZ_FILE, BETA_OUTPUT_FOLDER, [], [], BETA_RESULTS_FILE, jobs, sweep_formats)
 
-def discover_files(this_main: str, this_aaaa: str, this_zzzz: str, this_output_folder: str, this_verified_raw_files:list[DataEntry], this_verified_compressed_files:list[DataEntry], output_file: str):
+
+def discover_files(this_main: str, this_aaaa: str, this_zzzz: str, this_output_folder: str, this_verified_raw_files:list[DataEntry], this_verified_compressed_files:list[DataEntry], output_file: str, jobs:int=1, sweep_formats:list[tuple]=None):
     if any([not exists(x) for x in [this_zzzz, this_aaaa, this_main]]):
         return
 
     ensure_dir(this_output_folder)
 
-    this_zzzz_dat = file_cache.get_file_bytes(this_zzzz)
-    this_aaaa_dat = file_cache.get_file_bytes(this_aaaa)
-    this_main_dol = file_cache.get_file_bytes(this_main)
+    # every stage is saved as it finishes, a rerun skips the stages whose inputs haven't changed
+    checkpoint = Checkpoint(join(this_output_folder, NAME_FILE_CHECKPOINT))
+    all_inputs = [this_main, this_aaaa, this_zzzz]
+    known_entries = [entries_to_json(this_verified_raw_files), entries_to_json(this_verified_compressed_files)]
 
     b1 = 11
     b2 = 4
     size = 200    
 
-    unverified_aaaa_decompressions = []
-    print(f'Doing brute force decompression check ({b1} {b2})...')
-    for i in progressbar.progressbar(range(0, len(this_aaaa_dat), 0x800)):
-        if ArchiveDecompressor(this_aaaa_dat[i : i + 2*size], b1, b2, size).is_valid_decompression():
-            unverified_aaaa_decompressions.append(DataEntry.from_dict({
-                "Input": this_aaaa,
-                "lookbackBitSize": b1,
-                "repetitionBitSize": b2,
-                "size": 0,
-                "offset": i,
-                "compressedSize": 0,
-                "compressionFlag": 0,
-            }))
-
-    main_search_results = FingerPrintSearcher(this_main_dol, this_aaaa).search_compression(b1, b2)
-    
-    rels = []
-    list_found_main_entries = list(main_search_results)
-    for entry in unverified_aaaa_decompressions:
-        matching_offsets = [x for x in list_found_main_entries if x.disk_location == entry.disk_location]
+    unverified_aaaa_decompressions = checkpoint.stage('aaaa candidates', [this_aaaa],
+        lambda: brute_force_search(this_aaaa, None, MultipleRanges(), [(b1, b2, size)], jobs),
+        entries_to_json, entries_from_json, params=[b1, b2, size])
 
-        assert(len(matching_offsets) in [0, 1])
-
-        if len(matching_offsets) > 0:
-            for r in matching_offsets:
-                r: DataEntry
-                if is_decompression_valid(r):
-                    rels.append(r)
+    rels = checkpoint.stage('rels', [this_main, this_aaaa],
+        lambda: find_rels(this_main, this_aaaa, unverified_aaaa_decompressions, b1, b2),
+        entries_to_json, entries_from_json, params=[b1, b2, size])
 
     rels_to_search = [this_main]
     for rel in rels:
@@ -155,9 +151,14 @@ def discover_files(this_main: str, this_aaaa: str, this_zzzz: str, this_output_f
 
         if not exists(rel_output_path):
             write_bytes(decompress(rel), rel_output_path)
-    
-    main_search_results: set[DataEntry] = set()
-    found_raw_entries:set[DataEntry] = set()
+
+    # the game references files of every format, not just the one its rels use
+    fingerprint_formats = [(b1, b2)] if sweep_formats == None else sweep_formats
+
+    # the rels come from main.dol and aaaa.dat, so those cover them
+    list_entries, list_raw_entries = checkpoint.stage('fingerprints', [this_main, this_aaaa],
+        lambda: find_fingerprints(this_zzzz, rels_to_search, rels, fingerprint_formats),
+        lambda x: [entries_to_json(y) for y in x], lambda x: [entries_from_json(y) for y in x], params=[this_zzzz, b1, b2, size, fingerprint_formats])
 
     # start mapping out all files
     verified_entries:list[DataEntry] = list()
@@ -166,11 +167,176 @@ def discover_files(this_main: str, this_aaaa: str, this_zzzz: str, this_output_f
     verified_raw_entries:list[DataEntry] = list()
     verified_raw_entries.extend(this_verified_raw_files)
 
+    # start mapping file    
+    file_mapping = MultipleRanges()
+
+    for known_file in this_verified_raw_files:
+        known_file: DataEntry
+
+        verified_raw_entries.append(known_file)
+        file_mapping.add_range(known_file.to_range())
+
+    new_entries = checkpoint.stage('verified compressed', all_inputs,
+        lambda: verify_compressed_entries(list_entries),
+        entries_to_json, entries_from_json, params=[known_entries, fingerprint_formats])
+    verified_entries.extend(new_entries)
+    file_mapping.add_ranges([x.to_range() for x in new_entries])
+
+    if sweep_formats == None:
+        formats_to_search = [(11,4,200)]
+        search = lambda: brute_force_search(this_zzzz, this_output_folder, file_mapping, formats_to_search, jobs)
+    else:
+        # every offset tries all formats at once and keeps the one that decodes the furthest
+        formats_to_search = [(b1, b2, size) for b1, b2 in sweep_formats]
+        search = lambda: sweep_search(this_zzzz, this_output_folder, file_mapping, sweep_formats, size, SWEEP_RANK_SIZE, jobs)
+
+    unverified_aaaa_decompressions = checkpoint.stage('brute force', all_inputs, search,
+        entries_to_json, entries_from_json, params=[known_entries, fingerprint_formats, formats_to_search, sweep_formats != None, this_output_folder])
+    probe_sizes = {(b1, b2): size for b1, b2, size in formats_to_search}
+    file_mapping.add_ranges([range(x.disk_location, x.disk_location + probe_sizes[(x.lookback_bit_size, x.repetition_bit_size)]) for x in unverified_aaaa_decompressions])
+    
+    ad_gc_forms = checkpoint.stage('AdGCForms', [this_zzzz],
+        lambda: find_adgcforms(this_zzzz, this_output_folder),
+        entries_to_json, entries_from_json, params=[this_output_folder])
+
+    print('Verifying found raw data...')
+    for new_entry in progressbar.progressbar(list_raw_entries):
+        
+        new_entry:DataEntry
+        entry_range = new_entry.to_range()
+        # if the proposed range overlaps with previous entries, skip
+        if file_mapping.does_overlap(entry_range):
+            continue
+
+        # if is_decompression_valid(new_entry):
+        new_entry.output_name = join(this_output_folder, "raw " + new_entry.output_name.strip(this_zzzz))
+        verified_raw_entries.append(new_entry)
+        file_mapping.add_range(new_entry.to_range())
+
+    measure_unreferenced_files(this_zzzz, unverified_aaaa_decompressions, verified_entries + verified_raw_entries, ad_gc_forms)
+
+    output = {
+        'GameReferencedCompressedFiles': [x.to_dict() for x in verified_entries],
+        'GameReferencedRawFiles': [x.to_dict() for x in verified_raw_entries],
+        'UnreferencedCompressedFiles': [x.to_dict() for x in unverified_aaaa_decompressions],
+        'AdGCForms': [x.to_dict() for x in ad_gc_forms],
+    }
+    
+    write_json_atomic(output, output_file)
+    Catalog.from_json(output).save(catalog_path(output_file))
+    
+    return output
+
+def brute_force_search(this_file:str, this_output_folder:str, file_mapping:MultipleRanges, formats_to_search:list[tuple], jobs:int=1) -> list[DataEntry]:
+    """Entries at every 0x800 offset outside of file_mapping where the start of the data decompresses."""
+    print(f'Doing brute force decompression check ({", ".join(f"{b1} {b2}" for b1, b2, _ in formats_to_search)})...')
+    # a found range is smaller than 0x800, so it never covers the next offset
+    offsets = np.arange(0, len(file_cache.get_archive(this_file)), 0x800)
+    offsets = offsets[~file_mapping.contains_many(offsets)]
+
+    found:list[DataEntry] = []
+    for (b1, b2, size), found_offsets in zip(formats_to_search, scan_offsets(this_file, offsets, formats_to_search, jobs)):
+        found.extend(unverified_entry(this_file, this_output_folder, b1, b2, i) for i in found_offsets.tolist())
+    return found
+
+def sweep_search(this_file:str, this_output_folder:str, file_mapping:MultipleRanges, formats:list[tuple], size:int, rank_size:int, jobs:int=1) -> list[DataEntry]:
+    """Entries at every 0x800 offset outside of file_mapping that decompress at least size bytes with one of the (lookback, repetition) formats.
+
+    An entry gets the format that decodes the furthest, up to rank_size bytes, the first format wins a tie.
+    """
+    print(f'Doing brute force decompression sweep ({", ".join(f"{b1} {b2}" for b1, b2 in formats)})...')
+    offsets = np.arange(0, len(file_cache.get_archive(this_file)), 0x800)
+    offsets = offsets[~file_mapping.contains_many(offsets)]
+
+    lengths = run_shards(sweep_shard, this_file, offsets, (formats, rank_size), len(formats), jobs)
+    best = np.argmax(lengths, axis=1)
+    found = np.flatnonzero(lengths[np.arange(len(offsets)), best] >= size)
+
+    return [unverified_entry(this_file, this_output_folder, *formats[best[i]], int(offsets[i])) for i in found]
+
+def unverified_entry(this_file:str, this_output_folder:str, b1:int, b2:int, offset:int) -> DataEntry:
+    entry = {
+        "Input": this_file,
+        "lookbackBitSize": b1,
+        "repetitionBitSize": b2,
+        "size": 0,
+        "offset": offset,
+        "compressedSize": 0,
+        "compressionFlag": 0,
+    }
+    if this_output_folder != None:
+        entry["Output"] = join(this_output_folder, f"cmp unverified {offset:x}.dat")
+    return DataEntry.from_dict(entry)
+
+def probe_shard(this_file:str, offsets:np.ndarray, formats:list[tuple]) -> np.ndarray:
+    # every worker maps the file itself, the pages are shared between them
+    view = file_cache.get_file_view(this_file)
+    return np.array([probe_compressed_offsets(view, offsets, b1, b2, size, 2*size) for b1, b2, size in formats], dtype=bool).reshape(len(formats), len(offsets)).T
+
+def sweep_shard(this_file:str, offsets:np.ndarray, formats:list[tuple], rank_size:int) -> np.ndarray:
+    view = file_cache.get_file_view(this_file)
+    return decode_lengths(view, offsets, formats, rank_size, 2*rank_size)
+
+def run_shards(shard_function, this_file:str, offsets:np.ndarray, args:tuple, probes_per_offset:int, jobs:int=1) -> np.ndarray:
+    """shard_function(this_file, offsets, *args) over contiguous shards of offsets, the results stacked in offset order."""
+    # a few shards per worker so they finish at about the same time
+    shards = np.array_split(offsets, max(1, min(len(offsets), jobs * 4)))
+
+    start = perf_counter()
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(progressbar.progressbar(executor.map(shard_function, repeat(this_file), shards, *[repeat(x) for x in args]), max_value=len(shards)))
+    else:
+        results = [shard_function(this_file, x, *args) for x in progressbar.progressbar(shards)]
+    seconds = max(perf_counter() - start, 1e-9)
+    probe_count = len(offsets) * probes_per_offset
+    print(f'{probe_count} probes in {seconds:.2f}s, {probe_count / seconds:.0f} probes/s')
+
+    return np.concatenate(results)
+
+def scan_offsets(this_file:str, offsets:np.ndarray, formats:list[tuple], jobs:int=1) -> list[np.ndarray]:
+    """The offsets that decompress for every (lookback, repetition, size) format, all formats are probed in one pass.
+
+    An offset that an earlier format found is left out of the later ones, as if they were searched one after another.
+    """
+    valid = run_shards(probe_shard, this_file, offsets, (formats,), len(formats), jobs)
+
+    found = []
+    taken = np.zeros(len(offsets), dtype=bool)
+    for i in range(len(formats)):
+        found.append(offsets[valid[:, i] & ~taken])
+        taken |= valid[:, i]
+    return found
+
+def find_rels(this_main:str, this_aaaa:str, aaaa_candidates:list[DataEntry], b1:int, b2:int) -> list[DataEntry]:
+    """The compressed rels in aaaa.dat that main.dol references."""
+    main_search_results = FingerPrintSearcher(file_cache.get_file_bytes(this_main), this_aaaa).search_compression(b1, b2)
+
+    rels = []
+    list_found_main_entries = list(main_search_results)
+    for entry in aaaa_candidates:
+        matching_offsets = [x for x in list_found_main_entries if x.disk_location == entry.disk_location]
+
+        assert(len(matching_offsets) in [0, 1])
+
+        if len(matching_offsets) > 0:
+            for r in matching_offsets:
+                r: DataEntry
+                if is_decompression_valid(r):
+                    rels.append(r)
+    return rels
+
+def find_fingerprints(this_zzzz:str, rels_to_search:list[str], rels:list[DataEntry], formats:list[tuple]) -> tuple[list[DataEntry], list[DataEntry]]:
+    """The compressed and raw entries of the archive that the code references."""
+    main_search_results: set[DataEntry] = set()
+    found_raw_entries:set[DataEntry] = set()
+
     # accumulate all entries that look like a decompression fingerprint
     print("Searching rels...")
     for rel in progressbar.progressbar(rels_to_search):
         searcher = FingerPrintSearcher(file_cache.get_file_bytes(rel), this_zzzz)
-        main_search_results.update(searcher.search_compression(11, 4))
+        for b1, b2 in formats:
+            main_search_results.update(searcher.search_compression(b1, b2))
         found_raw_entries.update(searcher.search_uncompressed())
 
     list_entries = list(main_search_results)
@@ -183,69 +349,41 @@ def discover_files(this_main: str, this_aaaa: str, this_zzzz: str, this_output_f
 
     list_raw_entries = list(found_raw_entries)
     list_raw_entries.sort(key=lambda x: x.disk_location)
+    return list_entries, list_raw_entries
 
-    # start mapping file    
-    file_mapping = MultipleRanges()
-
-    for known_file in this_verified_raw_files:
-        known_file: DataEntry
-
-        verified_raw_entries.append(known_file)
-        file_mapping.add_range(known_file.to_range())
+def verify_compressed_entries(list_entries:list[DataEntry]) -> list[DataEntry]:
+    verified_entries = []
 
     # check new entries
     print('verifying found compressed data...')
     for new_entry in progressbar.progressbar(list_entries):
         new_entry:DataEntry
-        entry_range = new_entry.to_range()
 
         if is_decompression_valid(new_entry):
             new_entry.output_name = join(OUTPUT_FOLDER, "cmp " + new_entry.output_name.strip(US_ZZZZ_FILE))
             verified_entries.append(new_entry)
-            file_mapping.add_range(entry_range)
-    
-    unverified_aaaa_decompressions:list[DataEntry] = list()
+    return verified_entries
 
-    formats_to_search = [(11,4,200)]
-    for b1, b2, size in formats_to_search:
-        print(f'Doing brute force decompression check ({b1} {b2})...')
-        for i in progressbar.progressbar(range(0, len(this_zzzz_dat), 0x800)):
-            if i in file_mapping:
-                continue
-            if ArchiveDecompressor(this_zzzz_dat[i:i+2*size], b1, b2, size).is_valid_decompression():
-                unverified_aaaa_decompressions.append(DataEntry.from_dict({
-                    "Input": this_zzzz,
-                    "Output": join(this_output_folder, f"cmp unverified {i:x}.dat"),
-                    "lookbackBitSize": b1,
-                    "repetitionBitSize": b2,
-                    "size": 0,
-                    "offset": i,
-                    "compressedSize": 0,
-                    "compressionFlag": 0,
-                }))
-                file_mapping.add_range(range(i, i+size))
-    
-    ad_gc_search = this_zzzz_dat[:]
+def find_adgcforms(this_zzzz:str, this_output_folder:str) -> list[DataEntry]:
+    archive = file_cache.get_archive(this_zzzz)
     adgcform = b'AdGCForm'
-    ind = ad_gc_search.find(adgcform)
+
+    # the size and compression info are the 8 bytes before the name
+    form_indices = []
+    ind = archive.find(adgcform, 8)
+    while ind != -1:
+        form_indices.append(ind)
+        ind = archive.find(adgcform, ind + len(adgcform))
+
     ad_gc_forms:list[DataEntry] = []
-    offset = 0
-    found_form_count = ad_gc_search.count(adgcform)
     print(f'Verifying AdGCForms...')
-    bar = progressbar.ProgressBar(0, found_form_count)
-    bar.start()
-    form_i = 0
-    while ind != -1:
-        data_begins = ind + len(adgcform)
-        this_adgc_form_location = data_begins + offset
-        
-        finger_print = ad_gc_search[ind-8:ind]
-        
-        original_size, compression_info = unpack('<II', finger_print)
+    for ind in progressbar.progressbar(form_indices):
+        this_adgc_form_location = ind + len(adgcform)
+
+        original_size, compression_info = unpack_from('<II', archive.data, ind - 8)
         compressed_flag = original_size >> 28
         original_size &= 0xfffffff
 
-
         if compressed_flag == 0:
             lookback_bit = 0
             repetition_bit = 0
@@ -254,10 +392,13 @@ def discover_files(this_main: str, this_aaaa: str, this_zzzz: str, this_output_f
             lookback_bit = compression_info & 0xff
             repetition_bit = (compression_info >> 8) & 0xff
 
-            decompressor = ArchiveDecompressor(this_zzzz_dat[this_adgc_form_location:], lookback_bit, repetition_bit, original_size)
-            decompressor.decompress()
-
-            compressed_size = decompressor.compressed_size
+            # only the length is needed, so walk the tokens instead of decompressing
+            form_data = archive.get_view(this_adgc_form_location, max_compressed_size(original_size, lookback_bit, repetition_bit))
+            try:
+                compressed_size = ArchiveDecompressor(form_data, lookback_bit, repetition_bit, original_size).measure_compressed_size()
+            except ValueError:
+                print(f"Skipping AdGCForm at {this_adgc_form_location:08x}, its data doesn't decompress")
+                continue
 
         ad_gc_forms.append(DataEntry.from_dict({
                 "Input": this_zzzz,
@@ -269,48 +410,66 @@ def discover_files(this_main: str, this_aaaa: str, this_zzzz: str, this_output_f
                 "compressedSize": compressed_size,
                 "compressionFlag": compressed_flag,
         }))
-
-        new_ad_gc_search = ad_gc_search[ind+len(adgcform):]
-        removed_space = len(ad_gc_search) - len(new_ad_gc_search)
-        offset += removed_space
-
-        ad_gc_search = new_ad_gc_search
-        ind = ad_gc_search.find(adgcform)
-        form_i += 1
-        bar.update(form_i)
-    bar.finish()
-
-    print('Verifying found raw data...')
-    for new_entry in progressbar.progressbar(list_raw_entries):
-        
-        new_entry:DataEntry
-        entry_range = new_entry.to_range()
-        # if the proposed range overlaps with previous entries, skip
-        if file_mapping.does_overlap(entry_range):
+    return ad_gc_forms
+
+def measure_unreferenced_files(this_zzzz:str, unreferenced_entries:list[DataEntry], known_entries:list[DataEntry], ad_gc_forms:list[DataEntry]):
+    """Sets the compressed size of unreferenced entries, an entry ends before the next entry that is known to start."""
+    archive = file_cache.get_archive(this_zzzz)
+
+    # an AdGCForm starts with 8 bytes of size info and its name
+    starts = [x.disk_location for x in known_entries + unreferenced_entries if x.file == this_zzzz]
+    starts += [x.disk_location - 16 for x in ad_gc_forms if x.file == this_zzzz]
+    starts.sort()
+
+    print('Measuring unreferenced compressed data...')
+    for entry in progressbar.progressbar(unreferenced_entries):
+        ind = bisect_right(starts, entry.disk_location)
+        end = starts[ind] if ind < len(starts) else len(archive)
+        if end - entry.disk_location > max_compressed_size(RollingDecompressor.MAX_SIZE, entry.lookback_bit_size, entry.repetition_bit_size):
+            continue # too far to the next entry, the size stays unknown
+
+        # drop the zero padding before the next entry
+        region = np.frombuffer(archive.get_view(entry.disk_location, end - entry.disk_location), dtype=np.uint8)
+        used = len(region) - int(np.argmax(region[::-1] != 0)) if region.any() else 0
+        used += -used % 4
+
+        # a stream that ends in zero words can't be told apart from the padding, a shorter size would cut it off.
+        # only a stream that decodes to exactly the end of the data gets a size, the others stay unknown
+        try:
+            measurement = measure(region[:used], entry.lookback_bit_size, entry.repetition_bit_size)
+        except ValueError:
             continue
-
-        # if is_decompression_valid(new_entry):
-        new_entry.output_name = join(this_output_folder, "raw " + new_entry.output_name.strip(this_zzzz))
-        verified_raw_entries.append(new_entry)
-        file_mapping.add_range(new_entry.to_range())
-
-    output = {
-        'GameReferencedCompressedFiles': [x.to_dict() for x in verified_entries],
-        'GameReferencedRawFiles': [x.to_dict() for x in verified_raw_entries],
-        'UnreferencedCompressedFiles': [x.to_dict() for x in unverified_aaaa_decompressions],
-        'AdGCForms': [x.to_dict() for x in ad_gc_forms],
-    }
-    
-    with open(output_file, "w") as f:
-        json.dump(output, f, indent=2)
-    
-    return output
+        if measurement.compressed_size == used:
+            entry.compressed_size = used
 
 def is_decompression_valid(d: DataEntry) -> bool:
-    byte_data = file_cache.get_file_bytes(d.file)[d.disk_location : d.disk_location+d.compressed_size]
+    byte_data = file_cache.get_file_view(d.file, d.disk_location, d.compressed_size)
     return ArchiveDecompressor(byte_data, d.lookback_bit_size, d.repetition_bit_size).is_valid_decompression()
 
 
 def decompress(d: DataEntry) -> bytearray:
-    byte_data = file_cache.get_file_bytes(d.file)[d.disk_location : d.disk_location+d.compressed_size]
-    return ArchiveDecompressor(byte_data, d.lookback_bit_size, d.repetition_bit_size).decompress()
+    global decompression_cache
+    if decompression_cache == None:
+        decompression_cache = DecompressionCache(DECOMPRESSION_CACHE_FOLDER, DECOMPRESSION_CACHE_SIZE)
+
+    byte_data = file_cache.get_file_view(d.file, d.disk_location, d.compressed_size)
+    return decompression_cache.decompress(byte_data, d.lookback_bit_size, d.repetition_bit_size)
+
+DISCOVERY_FUNCTIONS = {
+    "US": discover_US_files,
+    "JP": discover_JP_files,
+    "EU": discover_EU_files,
+    "Beta": discover_beta_files,
+}
+
+def main():
+    parser = ArgumentParser(description="Find the files in a ZZZZ.dat and write them to results.json")
+    parser.add_argument("--version", choices=DISCOVERY_FUNCTIONS.keys(), default="US")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes for the brute force scan")
+    parser.add_argument("--sweep", action="store_true", help=f"try every format in {SWEEP_FORMATS} instead of only (11, 4) and keep the one that decodes the furthest")
+    args = parser.parse_args()
+
+    DISCOVERY_FUNCTIONS[args.version](max(1, args.jobs), SWEEP_FORMATS if args.sweep else None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from os.path import exists
+from random import Random
+import argparse
+
+import helper_mssb_data
+from helper_mssb_data import ArchiveDecompressor, ArchiveCompressor, ArchiveReader
+from run_benchmark import VERSION_FILES, load_compressed_entries
+
+FORMATS = [(11, 4), (0xe, 5), (8, 3), (4, 2)]
+
+def run_codec(use_native:bool, func):
+    helper_mssb_data.USE_NATIVE_CODEC = use_native
+    try:
+        return ("ok", func())
+    except ValueError as e:
+        return ("error", str(e))
+    finally:
+        helper_mssb_data.USE_NATIVE_CODEC = helper_mssb_data.NATIVE_CODEC_AVAILABLE
+
+def decompress_result(buffer:bytes, lookback:int, repetition:int, original_size:int):
+    d = ArchiveDecompressor(buffer, lookback, repetition, original_size)
+    output = d.decompress()
+    return bytes(output), d.compressed_size
+
+def validation_result(buffer:bytes, lookback:int, repetition:int, original_size:int):
+    d = ArchiveDecompressor(buffer, lookback, repetition, original_size)
+    return d.is_valid_decompression(), d.compressed_size
+
+def compress_result(data:bytes, lookback:int, repetition:int):
+    return bytes(ArchiveCompressor(data, lookback, repetition).compress())
+
+def compare(name:str, func) -> bool:
+    python_result = run_codec(False, func)
+    native_result = run_codec(True, func)
+
+    if python_result != native_result:
+        print(f"Mismatch in {name}")
+        return False
+    return True
+
+def random_cases(count:int, seed:int):
+    rng = Random(seed)
+    for i in range(count):
+        lookback, repetition = rng.choice(FORMATS)
+        # few distinct symbols make long and overlapping runs
+        alphabet = rng.choice([1, 2, 4, 16, 256])
+        data = bytes(rng.randrange(alphabet) for _ in range(rng.randrange(0, 2000)))
+        noise = bytes(rng.randrange(256) for _ in range(rng.randrange(0, 400)))
+        yield i, lookback, repetition, data, noise
+
+def check_random(count:int, seed:int) -> int:
+    failures = 0
+    for i, lookback, repetition, data, noise in random_cases(count, seed):
+        failures += not compare(f"random compress {i}", lambda: compress_result(data, lookback, repetition))
+
+        compressed = compress_result(data, lookback, repetition)
+        for original_size in [len(data), max(0, len(data) - 5), None]:
+            failures += not compare(f"random decompress {i} ({original_size})", lambda: decompress_result(compressed, lookback, repetition, original_size))
+
+        # garbage streams exercise the error paths
+        for original_size in [50, 200, None]:
+            failures += not compare(f"random garbage decompress {i} ({original_size})", lambda: decompress_result(noise, lookback, repetition, original_size))
+            failures += not compare(f"random garbage validation {i} ({original_size})", lambda: validation_result(noise, lookback, repetition, original_size))
+    return failures
+
+def check_archive(zzzz_file:str, results_file:str, limit:int, recompress:bool) -> int:
+    failures = 0
+
+    zzzz_dat = ArchiveReader(zzzz_file)
+
+    for entry in load_compressed_entries(zzzz_file, results_file, limit):
+        name = f"{entry.disk_location:08X}"
+        data = zzzz_dat.get_entry_view(entry)
+        args = (data, entry.lookback_bit_size, entry.repetition_bit_size, entry.original_size)
+
+        failures += not compare(f"{name} decompress", lambda: decompress_result(*args))
+        failures += not compare(f"{name} validation", lambda: validation_result(*args))
+        failures += not compare(f"{name} probe", lambda: validation_result(data[:400], entry.lookback_bit_size, entry.repetition_bit_size, 200))
+
+        if recompress:
+            decompressed = decompress_result(*args)[0]
+            failures += not compare(f"{name} compress", lambda: compress_result(decompressed, entry.lookback_bit_size, entry.repetition_bit_size))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the native codec gives the same results as the python codec")
+    parser.add_argument("--version", choices=VERSION_FILES.keys(), default="US")
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N archive entries")
+    parser.add_argument("--random", type=int, default=200, help="number of randomized cases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recompress", action="store_true", help="also compress every archive entry again, slow with the python codec")
+    args = parser.parse_args()
+
+    if not helper_mssb_data.NATIVE_CODEC_AVAILABLE:
+        print("The native codec is not built, run build_native.py first.")
+        return
+
+    failures = check_random(args.random, args.seed)
+
+    zzzz_file, results_file = VERSION_FILES[args.version]
+    if exists(zzzz_file) and exists(results_file):
+        failures += check_archive(zzzz_file, results_file, args.limit, args.recompress)
+    else:
+        print(f"Skipping archive entries, {zzzz_file} and {results_file} are needed.")
+
+    print(f"{failures} mismatches")
+    exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
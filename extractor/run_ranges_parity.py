@@ -0,0 +1,106 @@
+from random import Random
+import argparse
+
+from helper_mssb_data import MultipleRanges
+
+class ReferenceRanges:
+    """MultipleRanges kept the slow and obvious way, a list of ranges that is checked one range at a time."""
+    def __init__(self) -> None:
+        self.ranges:list[range] = []
+
+    def overlap(r1:range, r2:range) -> bool:
+        # a start or stop of one in the other, so ranges that touch overlap too
+        return (r2.start in r1 or r2.stop in r1) or (r1.start in r2 or r1.stop in r2)
+
+    def overlap_or_touch(r1:range, r2:range) -> bool:
+        return r1.start == r2.stop or r2.start == r1.stop or ReferenceRanges.overlap(r1, r2)
+
+    def add_range(self, r:range):
+        # empty ranges are all equal to each other, so they are told apart by what touches r, not with ==
+        combined = [x for x in self.ranges if ReferenceRanges.overlap_or_touch(r, x)]
+        points = [r.start, r.stop] + [x.start for x in combined] + [x.stop for x in combined]
+
+        self.ranges = [x for x in self.ranges if not ReferenceRanges.overlap_or_touch(r, x)] + [range(min(points), max(points))]
+        self.ranges.sort(key=lambda x: x.start)
+
+    def does_overlap(self, r:range) -> bool:
+        return any(ReferenceRanges.overlap(x, r) for x in self.ranges)
+
+    def remove_range(self, r:range):
+        if r.start >= r.stop:
+            return
+
+        # what is left of every range outside of r, an empty range goes when it is in or next to r
+        ranges = []
+        for x in self.ranges:
+            if len(x) == 0:
+                if not (r.start <= x.start <= r.stop):
+                    ranges.append(x)
+                continue
+            ranges += [y for y in [range(x.start, min(x.stop, r.start)), range(max(x.start, r.stop), x.stop)] if len(y) > 0]
+        self.ranges = ranges
+
+    def __contains__(self, value) -> bool:
+        return any(value in x for x in self.ranges)
+
+def random_range(rng:Random, size:int) -> range:
+    start = rng.randrange(size)
+    # empty and single value ranges find the edge cases
+    return range(start, start + rng.choice([0, 1, 2, rng.randrange(size // 4 + 1)]))
+
+def check_random(count:int, steps:int, size:int, seed:int) -> int:
+    rng = Random(seed)
+    failures = 0
+    for i in range(count):
+        ranges = MultipleRanges()
+        reference = ReferenceRanges()
+
+        for step in range(steps):
+            operation = rng.choice(["add", "add", "add many", "remove", "overlap"])
+            if operation == "add":
+                r = random_range(rng, size)
+                ranges.add_range(r)
+                reference.add_range(r)
+            elif operation == "add many":
+                # add_ranges is the same as adding them one after another
+                many = [random_range(rng, size) for _ in range(rng.randrange(4))]
+                ranges.add_ranges(many)
+                for r in many:
+                    reference.add_range(r)
+            elif operation == "remove":
+                r = random_range(rng, size)
+                ranges.remove_range(r)
+                reference.remove_range(r)
+            else:
+                r = random_range(rng, size)
+                if ranges.does_overlap(r) != reference.does_overlap(r):
+                    print(f"Mismatch in case {i} step {step}: does_overlap({r}) on {reference.ranges}")
+                    failures += 1
+
+            values = list(range(-2, size + size // 4 + 2))
+            expected = [x in reference for x in values]
+            if ranges.get_ranges() != reference.ranges:
+                print(f"Mismatch in case {i} step {step} after {operation}: {ranges.get_ranges()} should be {reference.ranges}")
+                failures += 1
+                break
+            if [x in ranges for x in values] != expected or ranges.contains_many(values).tolist() != expected:
+                print(f"Mismatch in case {i} step {step}: contains on {reference.ranges}")
+                failures += 1
+                break
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check MultipleRanges against a simple list of ranges with random operations")
+    parser.add_argument("--cases", type=int, default=500, help="number of randomized cases")
+    parser.add_argument("--steps", type=int, default=40, help="operations in every case")
+    parser.add_argument("--size", type=int, default=64, help="the ranges are in [0, size)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = check_random(args.cases, args.steps, args.size, args.seed)
+
+    print(f"{failures} mismatches")
+    exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()